@@ -2,7 +2,12 @@ import numpy as np
 import scipy.optimize as op
 import integration_constants as ic
 import scipy.special as sp
+from scipy.stats import beta
 import time
+import functools
+import hashlib
+import itertools
+import multiprocessing
 
 """ Contains functions used in fitting the power-law, exponential, log-normal,
 Weibull (stretched exponential), and power-law with exponential cutoff, as well
@@ -88,22 +93,461 @@ def pl(x):
     xtail = x[x>=xmin]
     ntail = len(xtail)
     start_time = time.time()
-    const = sp.zeta(alpha) - np.sum(np.arange(1,xmin)**(-alpha))
-    L = -alpha * np.sum(np.log(xtail)) - ntail*np.log(const)
+    L = -alpha * np.sum(np.log(xtail)) + ntail*np.log(ic.plconst(alpha, xmin))
     # print "-------%s seconds -----------" %(time.time()-start_time)
     # print "alpha = %s" %alpha
     # print "xmin = %s" %xmin
     return [alpha,xmin, ntail, L, ks]
 
-def plpval(x, alpha, xmin, gof):
+def plcounts(xvalues, counts, solver='grid', tol=1E-4, maxmem=2**28,
+             mintail=None, quantiles=None, xminrange=None):
+    """ Fits a tail-conditional power-law to a data set given in count form,
+    i.e., as the (xvalue, counts) pairs stored in the degree sequence files.
+    The tail sizes and tail log-sums for every xmin come from reverse
+    cumulative sums over the distinct values and all xmin candidates are
+    scored at once, so the data is never expanded. This is plbatch() for a
+    single data set.
+
+    With solver='grid' this runs the same grid search as pl(), with the same
+    normalizers (see plsweep()), and gives the same fit; this is what the
+    published results use. With
+    solver='continuous' the best alpha at each xmin is found by plalpha() to
+    within tol, using exact Hurwitz zeta normalizers.
+
+    Input:
+        xvalues      ndarray, ndim = 1, dtype = integer. Distinct data values
+        counts       ndarray, ndim = 1, dtype = integer. Number of times each
+                        value occurs
+        solver       string, 'grid' or 'continuous'
+        tol          float, width of the final bracket on alpha for
+                        solver='continuous'
+        maxmem       int, approximate cap (bytes) on the working arrays of
+                        plsweep() and plks()
+        mintail      int, only consider xmin with at least this many
+                        datapoints in the tail (see plbatch())
+        quantiles    (float, float), only consider xmin whose fraction of the
+                        data below it is in this range (see plbatch())
+        xminrange    (float, float), only consider xmin in this range (see
+                        plbatch())
+
+    Output:
+        alpha        float, exponent on x, must be > 1
+        xmin         int, starting point for power law tail, must be >= 1
+        ntail        int, number of datapoints above (and including) xmin
+        L            float, log likelihood of the returned fit
+        ks           float, goodness of fit statistic (Kolmogorov-Smirnov)
+    """
+    countM = np.asarray(counts)[None,:]
+    [alphaV, xminV, ntailV, LV, ksV] = plbatch(xvalues, countM, solver, tol,
+                                                maxmem, mintail, quantiles,
+                                                xminrange)
+    return [alphaV[0], xminV[0], int(ntailV[0]), LV[0], ksV[0]]
+
+def plbatch(xvalues, countM, solver='grid', tol=1E-4, maxmem=2**28,
+            mintail=None, quantiles=None, xminrange=None):
+    """ Fits a tail-conditional power-law to each of several data sets in count
+    form at once. The data sets share one set of distinct values, and each row
+    of countM holds one data set's counts (zero where a value does not occur).
+    Every (data set, xmin) candidate is scored in the same vectorized sweep, so
+    the Python overhead is shared by the whole batch. See plcounts() for the
+    solvers.
+
+    The xmin search can be narrowed with mintail (leave out the largest
+    candidates, whose tails are too small to matter), quantiles (keep only
+    candidates in a range of the data) and xminrange (keep only candidates in
+    a range of values). Every data set keeps at least its smallest candidate.
+    The candidates kept are scored as in the full search, as the normalizers
+    of pl() depend on every candidate below them (see plsweep()).
+    This is meant for bootstrap resamples (see plpval()), where the fit to the
+    original data already shows where xmin should be, and for snapshots of a
+    network that changes slowly (see plnear()).
+
+    Input:
+        xvalues      ndarray, ndim = 1, dtype = integer. Distinct data values
+        countM       ndarray, ndim = 2, dtype = integer. Row i holds the
+                        number of times each value occurs in data set i
+        solver       string, 'grid' or 'continuous'
+        tol          float, width of the final bracket on alpha for
+                        solver='continuous'
+        maxmem       int, approximate cap (bytes) on the working arrays of
+                        plsweep() and plks()
+        mintail      int, only consider xmin with at least this many
+                        datapoints in the tail
+        quantiles    (float, float), only consider xmin whose fraction of the
+                        (positive) data below it is in this range
+        xminrange    (float, float), only consider xmin in this range
+
+    Output:
+        alphaV       ndarray, best fit alpha for each data set
+        xminV        ndarray, best fit xmin for each data set
+        ntailV       ndarray, number of datapoints at or above each xmin
+        LV           ndarray, log likelihood of each fit
+        ksV          ndarray, KS statistic of each fit
+    """
+    xvalues = np.asarray(xvalues)
+    countM = np.asarray(countM)
+    nsets = countM.shape[0]
+    # sort the distinct values and drop zeros (these are never in the tail)
+    keep = (xvalues > 0) & (countM.sum(axis=0) > 0)
+    order = np.argsort(xvalues[keep])
+    xV = xvalues[keep][order]
+    countM = countM[:,keep][:,order]
+    # tail size and sum of log(x) over the tail, for every xmin at once
+    ntailM = np.cumsum(countM[:,::-1], axis=1)[:,::-1]
+    logsumM = np.cumsum((countM*np.log(xV))[:,::-1], axis=1)[:,::-1]
+    # the xmin candidates of all data sets, one after another
+    [rowV, colV] = np.nonzero(countM)
+    xminV = xV[colV]
+    ntailV = ntailM[rowV, colV]
+    logsumV = logsumM[rowV, colV]
+    firstV = np.append(True, rowV[1:] != rowV[:-1])
+    # optionally narrow the xmin search. The candidates left out still shape
+    # the normalizers of the others (see plsweep()), so narrowing only
+    # changes which candidates compete, not their scores
+    allowed = np.ones(len(colV), dtype=bool)
+    if mintail is not None:
+        allowed &= ntailV >= mintail
+    if quantiles is not None:
+        below = 1 - ntailV/ntailM[rowV,0].astype(float)
+        allowed &= (below >= quantiles[0]) & (below <= quantiles[1])
+    if xminrange is not None:
+        allowed &= (xminV >= xminrange[0]) & (xminV <= xminrange[1])
+    hasany = np.bincount(rowV[allowed], minlength=nsets) > 0
+    allowed |= firstV & ~hasany[rowV]
+    # same range of alpha as pl()
+    alstart = 1.01
+    shift = 9.50
+    if solver == 'grid':
+        alphaV = np.arange(alstart,alstart+shift,0.01)
+        [aindV, constV] = plsweep(xminV, ntailV, logsumV, firstV, alphaV,
+                                  maxmem, allowed)
+        alphaV = alphaV[aindV]
+    elif solver == 'continuous':
+        [alphaV, nevals] = plalpha(xminV[allowed], ntailV[allowed],
+                                   logsumV[allowed], alstart, alstart+shift,
+                                   tol)
+        constV = sp.zeta(alphaV, xminV[allowed])
+    else:
+        raise ValueError("solver must be 'grid' or 'continuous'")
+    rowV = rowV[allowed]
+    colV = colV[allowed]
+    xminV = xminV[allowed]
+    ntailV = ntailV[allowed]
+    logsumV = logsumV[allowed]
+    firstV = np.append(True, rowV[1:] != rowV[:-1])
+    ksV = plks(xV, ntailM, rowV, colV, alphaV, constV, maxmem)
+
+    # pull out the smallest KS statistic (first, i.e. smallest xmin, on ties)
+    # of every data set; data sets with no positive values are left as nan
+    startV = np.nonzero(firstV)[0]
+    ksmin = np.minimum.reduceat(ksV, startV)
+    best = np.nonzero(ksV == np.repeat(ksmin, np.diff(np.append(startV, len(ksV)))))[0]
+    best = best[np.unique(rowV[best], return_index=True)[1]]
+    rows = rowV[best]
+    fits = np.zeros([5, nsets]) + np.nan
+    fits[0,rows] = alphaV[best]
+    fits[1,rows] = xminV[best]
+    fits[2,rows] = ntailV[best]
+    fits[4,rows] = ksV[best]
+    # evaluate the likelihood there
+    const = ic.plconst(alphaV[best], xminV[best])
+    fits[3,rows] = -alphaV[best]*logsumV[best] + ntailV[best]*np.log(const)
+    alphaV = fits[0]
+    if len(rows) == nsets:
+        xminV = fits[1].astype(int)
+        ntailV = fits[2].astype(int)
+    else:
+        xminV = fits[1]
+        ntailV = fits[2]
+    return [alphaV, xminV, ntailV, fits[3], fits[4]]
+
+def plnear(x, xmin0, window=8.):
+    """ Fits a tail-conditional power-law like pl(), but only tries xmin within
+    a factor window of xmin0, e.g. the xmin of the previous snapshot of a
+    network whose degree distribution changes little from one to the next.
+    The candidates tried are scored as in the full search (see plbatch()) and
+    the normalizers are only built up to the largest of them, so the fit is
+    that of pl() whenever the best xmin overall is in the window. If the best
+    xmin is the smallest or largest one tried (and the data goes beyond it),
+    the best xmin may lie outside the range and the full search is done
+    instead. The KS statistic is not unimodal in xmin, though, so the best
+    xmin overall can also lie outside the window while the best one inside
+    it is not at an edge; that goes unnoticed here, which is why
+    analyze_degree_sequences() checks a sample of these fits against pl().
+
+    Input:
+        x            ndarray, ndim = 1, dtype = integer
+        xmin0        int, xmin to search around
+        window       float, factor by which xmin may differ from xmin0
+
+    Output:
+        alpha        float, exponent on x, must be > 1
+        xmin         int, starting point for power law tail, must be >= 1
+        ntail        int, number of datapoints above (and including) xmin
+        L            float, log likelihood of the returned fit
+        ks           float, goodness of fit statistic (Kolmogorov-Smirnov)
+        narrowed     Boolean, True if the narrowed search was kept, False if
+                        the full search was done
+    """
+    [xvalues, counts] = np.unique(x, return_counts=True)
+    xs = xvalues[xvalues > 0]
+    low = xmin0/float(window)
+    high = xmin0*float(window)
+    inside = xs[(xs >= low) & (xs <= high)]
+    if len(inside) > 0:
+        [alpha, xmin, ntail, L, ks] = plcounts(xvalues, counts,
+                                               xminrange=(low, high))
+        atedge = (xmin == inside[0] and inside[0] > xs[0]) or \
+                 (xmin == inside[-1] and inside[-1] < xs[-1])
+        if not atedge:
+            return [alpha, xmin, ntail, L, ks, True]
+    return plcounts(xvalues, counts) + [False]
+
+def plalpha(xminV, ntailV, logsumV, alow, ahigh, tol=1E-4):
+    """ Maximizes the tail-conditional power-law log likelihood over alpha for
+    every candidate xmin at once, by golden section search on [alow, ahigh].
+    The log likelihood
+
+        L(alpha) = -alpha * sum(log(xtail)) - ntail * log(HurwitzZeta(alpha, xmin))
+
+    is concave in alpha, so the search brackets the single maximum (or the
+    nearest end of the interval). Each step costs one zeta evaluation per
+    candidate; it takes about log((ahigh-alow)/tol)/log(1.618) steps.
+
+    Input:
+        xminV        ndarray, candidate xmin values
+        ntailV       ndarray, number of datapoints above (and including) each xmin
+        logsumV      ndarray, sum of log(x) over the tail of each xmin
+        alow         float, lower end of the bracket on alpha, must be > 1
+        ahigh        float, upper end of the bracket on alpha
+        tol          float, width of the final bracket
+
+    Output:
+        alphaV       ndarray, best alpha for each xmin
+        nevals       int, number of likelihood evaluations per candidate
+    """
+    loglike = lambda alpha: -alpha*logsumV - ntailV*np.log(sp.zeta(alpha, xminV))
+    invphi = (np.sqrt(5)-1)/2
+    a = np.zeros(len(xminV)) + alow
+    b = np.zeros(len(xminV)) + ahigh
+    c = b - invphi*(b-a)
+    d = a + invphi*(b-a)
+    Lc = loglike(c)
+    Ld = loglike(d)
+    nevals = 2
+    while (b[0]-a[0]) > tol:
+        # keep [a, d] if L(c) > L(d), otherwise keep [c, b]
+        left = Lc > Ld
+        a = np.where(left, a, c)
+        b = np.where(left, d, b)
+        # one interior point survives, so only one new evaluation per step
+        keep = np.where(left, c, d)
+        Lkeep = np.where(left, Lc, Ld)
+        new = np.where(left, b - invphi*(b-a), a + invphi*(b-a))
+        Lnew = loglike(new)
+        nevals += 1
+        c = np.where(left, new, keep)
+        Lc = np.where(left, Lnew, Lkeep)
+        d = np.where(left, keep, new)
+        Ld = np.where(left, Lkeep, Lnew)
+    return [(a+b)/2, nevals]
+
+def plsweep(xminV, ntailV, logsumV, firstV, alphaV, maxmem=2**28,
+            scoreV=None):
+    """ Finds the best alpha on a grid and its normalizer for every candidate
+    xmin at once. Candidates are given one data set after another, in
+    increasing order within each data set, and firstV marks where each data
+    set starts. The normalizers are those of pl(): starting from zeta(alpha),
+    pl() subtracts k^(-alpha) for k from xmin up to 2*xmin-xminprev-1 after
+    fitting at each candidate, one term at a time, so where a normalizer is
+    small next to zeta(alpha) what is left of it is rounding error, which
+    can even be negative. The same subtractions are replayed here in the same
+    order, with np.subtract.accumulate() over a table of k^(-alpha), so the
+    normalizers are equal to those of pl() to the last bit, and so are the
+    selected alphas up to the rounding of the tail log-sums. Terms are
+    processed in chunks so that the working arrays stay under maxmem.
+
+    Input:
+        xminV        ndarray, candidate xmin values
+        ntailV       ndarray, number of datapoints above (and including) each xmin
+        logsumV      ndarray, sum of log(x) over the tail of each xmin
+        firstV       ndarray, dtype = bool, True for the smallest candidate of
+                        each data set
+        alphaV       ndarray, grid of alpha values, all > 1
+        maxmem       int, approximate cap (bytes) on the working arrays
+        scoreV       ndarray, dtype = bool, candidates to find alpha for. The
+                        others only shape the normalizers, as in pl()
+                        (optional input, all by default)
+
+    Output:
+        aindV        ndarray, index into alphaV of the best alpha for each
+                        scored xmin
+        constV       ndarray, normalizer (as pl() has it) at the best alpha
+                        for each scored xmin
+    """
+    nx = len(xminV)
+    nalpha = len(alphaV)
+    if scoreV is None:
+        scoreV = np.ones(nx, dtype=bool)
+    # pl() fits candidate i after subtracting the first xminV[i-1] terms (the
+    # first xmin-1 for the smallest candidate), the terms being k^(-alpha)
+    # for k = q + xmin - xminprev - 1 at step q, xmin being the first
+    # candidate with xmin >= q
+    xprevV = np.where(firstV, xminV-1, np.append(0, xminV[:-1]))
+    gapV = xminV - xprevV - 1
+    stepV = xprevV
+    startV = np.nonzero(firstV)[0]
+    stopV = np.append(startV[1:], nx)
+    scored = np.cumsum(scoreV) - 1
+    aindV = np.zeros(np.sum(scoreV), dtype=int)
+    constV = np.zeros(np.sum(scoreV))
+    zetaV = sp.zeta(alphaV)
+    width = max(1, int(maxmem // (3*8*nalpha)))
+    # k^(-alpha) for every k needed, if it fits
+    kmax = np.max(xminV + gapV) if nx > 0 else 0
+    if kmax*nalpha*8 <= maxmem//2:
+        powM = np.power(np.arange(1, kmax+1, dtype=float)[:,None],
+                        -alphaV[None,:])
+    else:
+        powM = None
+    for [i0, i1] in zip(startV, stopV):
+        cands = i0 + np.nonzero(scoreV[i0:i1])[0]
+        if len(cands) == 0:
+            continue
+        nsteps = stepV[cands[-1]]
+        state = zetaV
+        for q0 in range(0, nsteps+1, width):
+            q1 = min(q0+width, nsteps+1)
+            # the state after step q0, then steps q0+1 to q1-1
+            q = np.arange(max(q0, 1), q1)
+            kV = q + gapV[i0 + np.searchsorted(xminV[i0:i1], q)]
+            A = np.zeros((q1-q0, nalpha))
+            A[0] = state
+            if powM is None:
+                A[q1-q0-len(q):] = np.power(kV[:,None].astype(float),
+                                            -alphaV[None,:])
+            else:
+                A[q1-q0-len(q):] = powM[kV-1]
+            if q0 > 0:
+                A[0] = state - A[0]
+            S = np.subtract.accumulate(A, axis=0)
+            state = S[-1]
+            # the candidates fitted after these steps
+            here = cands[(stepV[cands] >= q0) & (stepV[cands] < q1)]
+            if len(here) == 0:
+                continue
+            C = S[stepV[here]-q0]
+            # conditional log likelihoods, one row per xmin
+            with np.errstate(divide='ignore', invalid='ignore'):
+                Ls = -logsumV[here][:,None]*alphaV[None,:] - \
+                     ntailV[here][:,None]*np.log(C)
+            aind = Ls.argmax(axis=1)
+            aindV[scored[here]] = aind
+            constV[scored[here]] = C[np.arange(len(here)), aind]
+    return [aindV, constV]
+
+def plks(xV, ntailM, rowV, colV, alphaV, constV, maxmem=2**28):
+    """ KS statistic of a power-law fit at every candidate xmin at once. Both
+    cdfs are step functions on the integers, so the largest distance is
+    reached either at a data value or just before one, and only those points
+    are compared. Partial sums of x^(-alpha) come from Hurwitz zeta
+    differences. Candidates are processed in chunks so that the working arrays
+    stay under maxmem.
+
+    Input:
+        xV           ndarray, sorted distinct positive data values
+        ntailM       ndarray, ndim = 2, row i holds the number of datapoints
+                        of data set i at or above each value in xV
+        rowV         ndarray, data set of each candidate
+        colV         ndarray, index into xV of each candidate xmin
+        alphaV       ndarray, fitted alpha for each candidate
+        constV       ndarray, normalizer used with each alpha
+        maxmem       int, approximate cap (bytes) on the working arrays
+
+    Output:
+        ksV          ndarray, KS statistic for each candidate
+    """
+    nx = len(xV)
+    ncand = len(colV)
+    ntailnextM = np.append(ntailM[:,1:], np.zeros((ntailM.shape[0],1)), axis=1)
+    ksV = np.zeros(ncand)
+    width = max(1, int(maxmem // (8*8*nx)))
+    for i0 in range(0, ncand, width):
+        i1 = min(i0+width, ncand)
+        rows = np.arange(i1-i0)
+        cols = colV[i0:i1]
+        alpha = alphaV[i0:i1]
+        # zeta(alpha, x) for every data value x, one row per candidate
+        ualpha, inv = np.unique(alpha, return_inverse=True)
+        Z = sp.zeta(ualpha[:,None], xV[None,:])[inv]
+        Zxmin = Z[rows, cols][:,None]
+        P = xV[None,:]**(-alpha[:,None])
+        C = constV[i0:i1][:,None]
+        ntailall = ntailM[rowV[i0:i1]]
+        ntail = ntailall[rows, cols][:,None].astype(float)
+        # distance at each data value and at the integer just below it
+        with np.errstate(divide='ignore', invalid='ignore'):
+            D = np.abs((Zxmin - Z + P)/C - (1 - ntailnextM[rowV[i0:i1]]/ntail))
+            D = np.maximum(D, np.abs((Zxmin - Z)/C - (1 - ntailall/ntail)))
+        # values below xmin are not in the tail
+        D[np.arange(nx)[None,:] < cols[:,None]] = 0
+        ksV[i0:i1] = D.max(axis=1)
+    # a normalizer of exactly 0 (see plsweep()) gives an infinite cdf, as in
+    # pl(), rather than nan
+    ksV[np.isnan(ksV)] = np.inf
+    return ksV
+
+def plpval(x, alpha, xmin, gof, workers=1, seed=None, num_resamps=1000,
+           sequential=False, batch=50, pthresh=0.1, confidence=0.99,
+           block=None, solver='grid', maxmem=2**28, mintailfrac=None,
+           xminquantiles=None):
     """ Finds p-value for the power-law fit using a KS test. This is based on
     Aaron's plpva.m Matlab code (http://tuvalu.santafe.edu/~aaronc/powerlaws/).
+    Each resample draws from its own random stream, spawned from seed and the
+    resample's index (see plresample()), so the p-value for a given seed is the
+    same whatever the number of workers.
+
+    By default the bootstrap gives up after 500 seconds if the running p-value
+    is clearly small or large. With sequential=True it instead stops after any
+    batch of resamples once a confidence interval on p (see pvalinterval())
+    excludes pthresh, and otherwise runs all num_resamps resamples. The
+    intervals at each look are Bonferroni corrected, so that all of them hold
+    together with probability confidence.
+
+    With block=B the resamples are drawn and fitted B at a time, in count form,
+    by plresampleblock() and plbatch(); B sets the peak memory. Each block has
+    its own random stream, spawned from seed and the block's index.
+
+    The xmin search on the resamples can be narrowed to tails of at least
+    mintailfrac times the fitted ntail, or to a quantile range of the
+    resample (see plbatch()). This trades accuracy for speed; plpvaldrift()
+    reports how much of each.
 
     Input:
         x            ndarray, ndim = 1, dtype = integer
         alpha        float, exponent on x, must be > 1
         xmin         int, starting point for power law tail, must be >= 1
         gof           float, goodness of fit statistic (Kolmogorov-Smirnov)
+        workers      int, number of processes to spread the resamples over
+        seed         int, seed for the resamples. If None, one is drawn from
+                        the global numpy random state
+        num_resamps  int, (maximum) number of resamples
+        sequential   Boolean, stop as soon as p is known to be on one side of
+                        pthresh
+        batch        int, number of resamples between looks at p
+        pthresh      float, decision threshold on p (0.1 in the paper)
+        confidence   float, joint confidence level of the intervals on p
+        block        int, number of resamples drawn and fitted together. If
+                        None, each resample is drawn and fitted on its own
+                        (see plresample())
+        solver       string, 'grid' or 'continuous', how plcounts() or
+                        plbatch() fit the resamples
+        maxmem       int, approximate cap (bytes) on the working arrays of
+                        plbatch()
+        mintailfrac  float, only consider xmin on the resamples whose tail is
+                        at least this fraction of ntail
+        xminquantiles (float, float), only consider xmin on the resamples
+                        whose fraction of the data below it is in this range
 
 
     Output:
@@ -112,7 +556,6 @@ def plpval(x, alpha, xmin, gof):
     # set desired precision level in p-value
     eps = 0.01
     #num_resamps = int(np.ceil((1./4)*eps**(-2)))
-    num_resamps = 1000
     bootstraps = np.zeros(num_resamps)
     n = len(x)
     xmax = np.max(x)
@@ -122,73 +565,392 @@ def plpval(x, alpha, xmin, gof):
     ntail = len(xtail)
     nhead = len(xhead)
     ptail = float(ntail)/n
+    # the power-law tail is sampled up to mmax, larger draws become mmax+1
     mmax = 20*xmax
-    # set the tail of the pdf
-    #const_tail = ic.plconst(np.array(alpha),xmin)
-    const_tail = sp.zeta(alpha) - np.sum(np.arange(1,xmin)**(-alpha))
-    pdf_tail = np.arange(xmin,mmax+1)**(-alpha)/const_tail # i.e.; end at mmax
-    # pad this with zeros (rewrite if we don't need to do this)
-    pdf = np.zeros(mmax+1)
-    pdf[xmin:] = pdf_tail
-    # clean up in case this is a huge array
-    del pdf_tail
-    # set the cdf. rows are x-val or cdf(xval). So cdf(x=10) is cdf[1,10]
-    cdf = np.array( [ np.arange(mmax+1), np.cumsum(pdf) ] )
-    # tack on a last entry
-    cdf = np.concatenate( (cdf , np.array([[mmax+1,1]]).T) , axis = 1 )
+    if mintailfrac is None:
+        mintail = None
+    else:
+        mintail = int(np.ceil(mintailfrac*ntail))
+    if seed is None:
+        seed = np.random.randint(2**31)
+    # confidence level of each interval on p
+    nlooks = max(1, (num_resamps-1)//batch)
+    looklevel = 1 - (1-confidence)/nlooks
+    if block is None:
+        resample = functools.partial(plresample, xhead=xhead, n=n,
+                                     ptail=ptail, alpha=alpha, xmin=xmin,
+                                     mmax=mmax, seed=seed, solver=solver,
+                                     maxmem=maxmem, mintail=mintail,
+                                     quantiles=xminquantiles)
+        tasks = range(num_resamps)
+    else:
+        [headvalues, headcounts] = np.unique(xhead, return_counts=True)
+        resample = functools.partial(plresampleblock, block=block,
+                                     num_resamps=num_resamps,
+                                     headvalues=headvalues,
+                                     headcounts=headcounts, n=n, ptail=ptail,
+                                     alpha=alpha, xmin=xmin, mmax=mmax,
+                                     seed=seed, solver=solver, maxmem=maxmem,
+                                     mintail=mintail, quantiles=xminquantiles)
+        tasks = range(int(np.ceil(num_resamps/float(block))))
 
     # semi-parametric bootstrap
     starttime = time.time()
-    for resamp_ind in range(num_resamps):
-        # non-parametric bootstrap from the head of x
-        # count how many of n random numbers are in the head, based on the probability of being in the head of x
-        nnewhead = n
-        while nnewhead >= n:
-            nnewhead = np.sum(np.random.rand(n)>ptail)
-        headinds = np.array([np.floor(nhead*np.random.rand(nnewhead))],dtype=int)
-        newhead = xhead[headinds][0]
-        nnewtail  = n-nnewhead
-
-        # parametric bootstrap for the powerlaw tail
-        rtail = np.sort(np.random.rand(nnewtail))
-        newtail = np.zeros(nnewtail, dtype = int)
-        indrtail = 0
-        indnewtail = 0
-        for xval in range(xmin, mmax+2):
-            while (indrtail < len(rtail)) and (rtail[indrtail] <= cdf[1, xval]):
-                indrtail += 1
-            newtail[indnewtail:indrtail] = xval
-            indnewtail = indrtail
-            if indnewtail > nnewtail:
-                break
-        # combine into new sample
-        newx = np.concatenate((newhead, newtail))
-        if (newx == np.zeros_like(newx)).all():
-            import pdb; pdb.set_trace()
-        # fit this new sample
-        [newalpha, newxmin, newntail, newLpl, newgof] = pl(newx)
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        chunksize = max(1, len(tasks)//(4*workers))
+        newgofs = pool.imap(resample, tasks, chunksize)
+    else:
+        newgofs = itertools.imap(resample, tasks)
+    if block is not None:
+        newgofs = itertools.chain.from_iterable(newgofs)
+    for resamp_ind, newgof in enumerate(newgofs):
         # print where we are
         current_p = np.sum(bootstraps[0:resamp_ind]>=gof)/(float(resamp_ind+1))
         # print "[%s]    p = %f" %(resamp_ind, current_p)
         # store gof stat
         bootstraps[resamp_ind] = newgof
+        if sequential:
+            nsofar = resamp_ind+1
+            if nsofar % batch == 0 and nsofar < num_resamps:
+                nabove = np.sum(bootstraps[0:nsofar]>=gof)
+                [plow, phigh] = pvalinterval(nabove, nsofar, looklevel)
+                if plow > pthresh or phigh < pthresh:
+                    p = nabove/float(nsofar)
+                    print "p = %.3f   in [%.3f, %.3f] after %s resamples   elapsed time = %s" %(p, plow, phigh, nsofar, time.time()-starttime)
+                    if workers > 1:
+                        pool.terminate()
+                    return p
         # if it's taking forever and we can end, do it
-        if time.time() - starttime > 500:
+        elif time.time() - starttime > 500:
             if resamp_ind > num_resamps/20.:
                 if current_p<0.05 or current_p>0.5:
                     print "current p = %s   elapsed time = %s" %(current_p, time.time()-starttime)
+                    if workers > 1:
+                        pool.terminate()
                     return current_p
+    if workers > 1:
+        pool.close()
+        pool.join()
     p = np.sum(bootstraps>=gof)/float(num_resamps)
     print "p = %.3f   elapsed time = %s" %(p, time.time()-starttime)
     return p
 
-def exp(x):
+def plpvaldrift(x, alpha, xmin, gof, mintailfrac=None, xminquantiles=None,
+                seed=0, **kwargs):
+    """ Runs plpval() twice with the same seed, once with the full xmin search
+    on the resamples and once with it narrowed by mintailfrac and/or
+    xminquantiles, and reports the time saved and how far the p-value moved.
+    Because the seed is shared, both runs see the same resamples, fitted the
+    same way (see plresample()), so the drift is due to the narrowed search
+    alone. Any other keyword arguments are passed
+    on to plpval().
+
+    Input:
+        x            ndarray, ndim = 1, dtype = integer
+        alpha        float, exponent on x, must be > 1
+        xmin         int, starting point for power law tail, must be >= 1
+        gof          float, goodness of fit statistic (Kolmogorov-Smirnov)
+        mintailfrac  float, see plpval()
+        xminquantiles (float, float), see plpval()
+        seed         int, seed for the resamples of both runs
+
+    Output:
+        pfull        float, p-value with the full xmin search
+        pfast        float, p-value with the narrowed xmin search
+        tfull        float, seconds taken with the full xmin search
+        tfast        float, seconds taken with the narrowed xmin search
+    """
+    starttime = time.time()
+    pfull = plpval(x, alpha, xmin, gof, seed=seed, **kwargs)
+    tfull = time.time() - starttime
+    starttime = time.time()
+    pfast = plpval(x, alpha, xmin, gof, seed=seed, mintailfrac=mintailfrac,
+                   xminquantiles=xminquantiles, **kwargs)
+    tfast = time.time() - starttime
+    print "narrowed xmin search: %.1fs instead of %.1fs (%.1fx), p = %.3f instead of %.3f (drift %+.3f)" %(tfast, tfull, tfull/tfast, pfast, pfull, pfast-pfull)
+    return [pfull, pfast, tfull, tfast]
+
+def pvalinterval(nabove, nresamps, level):
+    """ Clopper-Pearson (exact binomial) confidence interval on a bootstrap
+    p-value, given how many of the resamples so far fit worse than the data.
+
+    Input:
+        nabove       int, number of resamples with gof >= the observed gof
+        nresamps     int, number of resamples so far
+        level        float, confidence level of the interval
+
+    Output:
+        plow         float, lower end of the interval
+        phigh        float, upper end of the interval
+    """
+    tail = (1-level)/2.
+    if nabove == 0:
+        plow = 0.
+    else:
+        plow = beta.ppf(tail, nabove, nresamps-nabove+1)
+    if nabove == nresamps:
+        phigh = 1.
+    else:
+        phigh = beta.ppf(1-tail, nabove+1, nresamps-nabove)
+    return [plow, phigh]
+
+def plresample(resamp_ind, xhead, n, ptail, alpha, xmin, mmax, seed,
+               solver='grid', maxmem=2**28, mintail=None, quantiles=None):
+    """ Draws and fits one semi-parametric bootstrap resample for plpval(). The
+    random stream is seeded with (seed, resamp_ind), so each resample is
+    reproducible on its own, whichever process runs it. The resample is fitted
+    in count form by plcounts(), which gives the fit of pl() (see plsweep()),
+    with or without a narrowed xmin search, so that runs with and without it
+    differ only in the narrowing (see plpvaldrift()).
+
+    Input:
+        resamp_ind   int, index of this resample
+        xhead        ndarray, data below xmin
+        n            int, size of the data set
+        ptail        float, fraction of the data at or above xmin
+        alpha        float, exponent on x, must be > 1
+        xmin         int, starting point for power law tail, must be >= 1
+        mmax         int, largest tail value drawn (see plsample())
+        seed         int, seed shared by all resamples of this p-value
+        solver       string, 'grid' or 'continuous', passed to plcounts()
+        maxmem       int, approximate cap (bytes) passed to plcounts()
+        mintail      int, passed to plcounts()
+        quantiles    (float, float), passed to plcounts()
+
+    Output:
+        gof          float, KS statistic of the fit to the resample
+    """
+    rng = np.random.RandomState([seed, resamp_ind])
+    nhead = len(xhead)
+    # non-parametric bootstrap from the head of x
+    # count how many of n random numbers are in the head, based on the probability of being in the head of x
+    nnewhead = n
+    while nnewhead >= n:
+        nnewhead = np.sum(rng.rand(n)>ptail)
+    headinds = np.array([np.floor(nhead*rng.rand(nnewhead))],dtype=int)
+    newhead = xhead[headinds][0]
+    nnewtail  = n-nnewhead
+    # parametric bootstrap for the powerlaw tail
+    newtail = plsample(nnewtail, alpha, xmin, mmax, rng)
+    # combine into new sample
+    newx = np.concatenate((newhead, newtail))
+    # fit this new sample
+    [newvalues, newcounts] = np.unique(newx, return_counts=True)
+    [newalpha, newxmin, newntail, newLpl, newgof] = plcounts(newvalues,
+                                newcounts, solver, maxmem=maxmem,
+                                mintail=mintail, quantiles=quantiles)
+    return newgof
+
+def plresampleblock(block_ind, block, num_resamps, headvalues, headcounts, n,
+                    ptail, alpha, xmin, mmax, seed, solver='grid',
+                    maxmem=2**28, mintail=None, quantiles=None):
+    """ Draws and fits one block of semi-parametric bootstrap resamples for
+    plpval(). The head/tail splits, the head resamples and the tail samples of
+    the whole block are drawn together, the resamples are kept in count form
+    (one row of counts per resample), and all of them are fitted by a single
+    call to plbatch(). The random stream is seeded with (seed, block_ind,
+    block).
+
+    Input:
+        block_ind    int, index of this block
+        block        int, number of resamples per block
+        num_resamps  int, total number of resamples (the last block may be
+                        smaller)
+        headvalues   ndarray, distinct data values below xmin
+        headcounts   ndarray, number of times each value in headvalues occurs
+        n            int, size of the data set
+        ptail        float, fraction of the data at or above xmin
+        alpha        float, exponent on x, must be > 1
+        xmin         int, starting point for power law tail, must be >= 1
+        mmax         int, largest tail value drawn (see plsample())
+        seed         int, seed shared by all resamples of this p-value
+        solver       string, 'grid' or 'continuous', passed to plbatch()
+        maxmem       int, approximate cap (bytes) passed to plbatch()
+        mintail      int, passed to plbatch()
+        quantiles    (float, float), passed to plbatch()
+
+    Output:
+        gofV         ndarray, KS statistic of the fit to each resample
+    """
+    rng = np.random.RandomState([seed, block_ind, block])
+    nblock = min(block, num_resamps - block_ind*block)
+    # number of draws from the head, redrawn (as in plresample()) until < n
+    nnewhead = rng.binomial(n, 1-ptail, nblock)
+    redraw = nnewhead >= n
+    while redraw.any():
+        nnewhead[redraw] = rng.binomial(n, 1-ptail, redraw.sum())
+        redraw = nnewhead >= n
+    nnewtail = n - nnewhead
+    # non-parametric bootstrap from the head: multinomial counts on the head
+    # values, drawn one value at a time for the whole block
+    headM = np.zeros((nblock, len(headvalues)), dtype=int)
+    nleft = nnewhead.copy()
+    pleft = 1.
+    pheadV = headcounts/float(np.sum(headcounts))
+    for j in range(len(headvalues)-1):
+        headM[:,j] = rng.binomial(nleft, min(1., pheadV[j]/pleft))
+        nleft -= headM[:,j]
+        pleft -= pheadV[j]
+    if len(headvalues) > 0:
+        headM[:,-1] = nleft
+    # parametric bootstrap for the powerlaw tail, counted per resample
+    newtail = plsample(np.sum(nnewtail), alpha, xmin, mmax, rng)
+    [tailvalues, tailinds] = np.unique(newtail, return_inverse=True)
+    rowinds = np.repeat(np.arange(nblock), nnewtail)
+    tailM = np.bincount(rowinds*len(tailvalues) + tailinds,
+                        minlength=nblock*len(tailvalues))
+    tailM = tailM.reshape(nblock, len(tailvalues))
+    # fit all the new samples at once
+    xvalues = np.append(headvalues, tailvalues)
+    countM = np.append(headM, tailM, axis=1)
+    [newalphaV, newxminV, newntailV, newLplV, gofV] = plbatch(xvalues, countM,
+                                                solver, maxmem=maxmem,
+                                                mintail=mintail,
+                                                quantiles=quantiles)
+    return gofV
+
+def plsample(n, alpha, xmin, xmax, rng=np.random, ntable=2**14):
+    """ Draws from the discrete power law with exponent alpha starting at xmin,
+    by inverting its cdf. The cdf is tabulated on the first ntable integers
+    from xmin and inverted with searchsorted(). The few draws beyond the table
+    are found by a vectorized bisection on the Hurwitz zeta survival function,
+    so neither the time nor the memory grows with xmax.
+
+    Input:
+        n            int, number of draws
+        alpha        float, exponent on x, must be > 1
+        xmin         int, starting point for power law tail, must be >= 1
+        xmax         int, largest value drawn; heavier draws are returned as
+                        xmax+1 (this is how plpval() truncates the tail)
+        rng          numpy RandomState (or the np.random module) to draw from
+        ntable       int, number of integers on which the cdf is tabulated
+
+    Output:
+        x            ndarray, ndim = 1, dtype = integer, n draws
+    """
+    const = 1./ic.plconst(alpha, xmin)
+    r = rng.rand(n)
+    # tabulated part of the cdf; x is the first value with r <= cdf(x)
+    xtable = np.arange(xmin, min(xmin+ntable, xmax+1))
+    cdf = np.cumsum(xtable**(-alpha)/const)
+    inds = np.searchsorted(cdf, r)
+    x = np.zeros(n, dtype=int)
+    intable = inds < len(xtable)
+    x[intable] = xtable[inds[intable]]
+    # bisect the rest on cdf(x) = 1 - zeta(alpha, x+1)/const, with
+    # cdf(lo) < r <= cdf(hi) throughout and cdf(xmax+1) taken to be 1
+    rest = np.nonzero(~intable)[0]
+    lo = np.zeros(len(rest), dtype=np.int64) + xtable[-1]
+    hi = np.zeros(len(rest), dtype=np.int64) + xmax+1
+    while len(rest) > 0 and (hi-lo).max() > 1:
+        mid = (lo+hi)//2
+        below = 1 - sp.zeta(alpha, mid+1)/const < r[rest]
+        lo = np.where(below, mid, lo)
+        hi = np.where(below, hi, mid)
+    x[rest] = hi
+    return x
+
+def fitmemo(memo, func, x, *args):
+    """ Calls func(x, *args) at most once per data set. The result is stored in
+    memo, a dict the caller keeps while it works on one degree sequence, under
+    the function's name, a hash of the bytes of x and the other arguments. A
+    later call with the same function and data returns the stored result, so
+    e.g. the exponential fit that lrt.nested() uses as plwc()'s starting point
+    is the one lrt.nonnested() already made. With memo=None this is just
+    func(x, *args).
+    Stored results are shared between callers and must not be modified.
+
+    Input:
+        memo        dict or None, fitted models, pointwise log-likelihoods etc.
+                        found so far
+        func        function, e.g. fit.exp or lrt.pllogpdf
+        x           ndarray, data set passed to func
+        args        further arguments of func, must be hashable
+
+    Output:
+        result      whatever func(x, *args) returns
+    """
+    if memo is None:
+        return func(x, *args)
+    key = fitkey(func, x, *args)
+    if key not in memo:
+        memo[key] = func(x, *args)
+    return memo[key]
+
+def fitkey(func, x, *args):
+    """ Key under which fitmemo() stores func(x, *args). Used directly to store
+    results computed elsewhere, e.g. by lrt.alternatives() in a worker.
+
+    Input:
+        func        function
+        x           ndarray, data set passed to func
+        args        further arguments of func, must be hashable
+
+    Output:
+        key         tuple
+    """
+    x = np.ascontiguousarray(x)
+    key = (func.__module__, func.__name__, x.dtype.str,
+           hashlib.sha1(x.tobytes()).hexdigest()) + args
+    return key
+
+def fitminimize(negloglike, theta0, bnds, info=None, fallback=None):
+    """ Minimizes a negative log-likelihood with L-BFGS-B within bounds. Used by
+    ln(), plwc() and strexp(). The starting point, which may be a warm start
+    from the fit of a related sequence, is first moved inside the bounds. If
+    the optimizer does not converge from it and a fallback starting point is
+    given, it is run again from there; a converged result is preferred, and
+    otherwise the one with the lower negative log-likelihood is kept.
+
+    Input:
+        negloglike      function, returns the negative log-likelihood at theta
+                            and its gradient
+        theta0          ndarray, starting point
+        bnds            list, (lower, upper) bound for each parameter, None if
+                            unbounded
+        info            dict, if given gets the number of iterations 'nit', the
+                            number of function evaluations 'nfev' and the
+                            starting point 'theta0' of the kept result, both
+                            counts including any fallback run (optional input)
+        fallback        ndarray, second starting point (optional input)
+
+    Output:
+        res             OptimizeResult, as returned by op.minimize()
+    """
+    low = [-np.inf if b[0] is None else b[0] for b in bnds]
+    high = [np.inf if b[1] is None else b[1] for b in bnds]
+    theta0 = np.clip(np.asarray(theta0, dtype=float), low, high)
+    res = op.minimize(negloglike, theta0, jac=True, bounds=bnds,
+                      method='L-BFGS-B')
+    nit = res.nit
+    nfev = res.nfev
+    if not res.success and fallback is not None:
+        fallback = np.clip(np.asarray(fallback, dtype=float), low, high)
+        res2 = op.minimize(negloglike, fallback, jac=True, bounds=bnds,
+                           method='L-BFGS-B')
+        nit += res2.nit
+        nfev += res2.nfev
+        if res2.success or res2.fun < res.fun:
+            res = res2
+            theta0 = fallback
+    if info is not None:
+        info['nit'] = nit
+        info['nfev'] = nfev
+        info['theta0'] = theta0
+    return res
+
+def exp(x, info=None):
     """ Fits a tail-conditional exponential to a data set. The data is assumed
     to begin at xmin. The logpdf is what is calculated and returned, as this is
-    more relevant for likelihood calculations.
+    more relevant for likelihood calculations. The discrete tail-conditional
+    exponential is a geometric distribution on x - xmin, so its maximum
+    likelihood estimate is found in closed form rather than by an optimizer.
 
     Input:
         x            ndarray, ndim = 1, dtype = integer
+        info         dict, if given gets the solver counts as in fitminimize()
+                        (zero here)
 
     Output:
         lam          float, exponential rate, must be > 0
@@ -197,37 +959,45 @@ def exp(x):
     """
     xmin = np.min(x)
     ntail = len(x)
+    # distinct values, their multiplicities, and the value each point maps to
+    [xV, invV, countV] = np.unique(x, return_inverse=True, return_counts=True)
     # define log pdf
     def logpdf(x,lam):
         result = np.log(1-np.exp(-lam))+lam*xmin - lam*x
         return result
-    if len(np.unique(x))<2:
+    if info is not None:
+        info['nit'] = 0
+        info['nfev'] = 0
+    if len(xV)<2:
         # this means every value is equal to xmin
         # return dummy answers and say we don't converge
         lam = 0
         LV =0
         convstatus = False
     else:
-        # Moment based estimate for optimzation
-        lam0 = np.log(1+float(ntail)/np.sum(x-xmin))
-        # define negative log likelihood, the function we wish to minimize
-        negloglike = lambda lam: -np.sum(logpdf(x,lam))
-        tol = 1E-9
-        res = op.minimize(negloglike,lam0, bounds=[(tol,None)],method='L-BFGS-B')
-        lam = np.asscalar(res.x)
-        convstatus = res.success
-        LV = logpdf(x,lam)
+        # the likelihood is maximal where 1/(e^lam - 1) = mean(x - xmin)
+        lam = np.log(1+float(ntail)/np.sum(countV*(xV-xmin)))
+        convstatus = True
+        LV = logpdf(xV,lam)[invV]
     return [lam, LV, convstatus]
 
-def ln(x):
+def ln(x, theta0=None, info=None):
     """ Fits a tail-conditional log normal distribution to a data set.
     The data is assumed to begin at xmin. The logpdf is what is calculated and
     returned, as this is more relevant for likelihood calculations.
     Discretization is done by binning the continuous distrbution
-    (see text for details)
+    (see text for details). The likelihood and its gradient are summed over
+    the distinct values of x weighted by their multiplicities. Unless a warm
+    start is given, the optimizer starts from the mean and standard deviation
+    of log(x). Where the fit runs off towards a power law (mu very negative,
+    sigma large) and does not converge from there, it is retried from
+    mu = 0, sigma = 1.
 
     Input:
         x               ndarray, ndim = 1, dtype = integer
+        theta0          ndarray, [mu, sigma] to start from, e.g. the fit of a
+                            related sequence (optional input)
+        info            dict, if given gets the solver counts, see fitminimize()
 
     Output:
         theta           ndarray, [mu, sigma] where mu is a float, the mean of the
@@ -238,6 +1008,8 @@ def ln(x):
     """
     xmin = np.min(x)
     ntail = len(x)
+    # distinct values, their multiplicities, and the value each point maps to
+    [xV, invV, countV] = np.unique(x, return_inverse=True, return_counts=True)
     # define log pdf
     def logpdf(x, mu, sigma):
         xmin = np.min(x)
@@ -245,29 +1017,65 @@ def ln(x):
         g = lambda x: F(x)- F(x+1)
         h = -np.log(F(xmin))+np.log(g(x))
         return h
+    # and its derivatives in mu and sigma
+    def dlogpdf(x, mu, sigma):
+        xmin = np.min(x)
+        F = lambda x: (sp.erfc((np.log(x)-mu)/(np.sqrt(2)*sigma)))/2
+        g = lambda x: F(x)- F(x+1)
+        # with w = (log(x)-mu)/sigma, dF/dmu = phi(w)/sigma and
+        # dF/dsigma = w phi(w)/sigma, phi being the standard normal pdf
+        def dF(x):
+            w = (np.log(x)-mu)/sigma
+            phi = np.exp(-w**2/2)/np.sqrt(2*np.pi)
+            return [phi/sigma, w*phi/sigma]
+        [dmu0, dsigma0] = dF(xmin)
+        [dmu1, dsigma1] = dF(x)
+        [dmu2, dsigma2] = dF(x+1)
+        dmu = -dmu0/F(xmin) + (dmu1-dmu2)/g(x)
+        dsigma = -dsigma0/F(xmin) + (dsigma1-dsigma2)/g(x)
+        return [dmu, dsigma]
     # initial estimates
-    mu0 = 0
-    sigma0 = 1
-    theta0 = np.array([mu0, sigma0])
+    if theta0 is None:
+        logxV = np.log(xV)
+        mu0 = np.sum(countV*logxV)/ntail
+        sigma0 = np.sqrt(np.sum(countV*(logxV-mu0)**2)/ntail)
+        theta0 = np.array([mu0, sigma0])
     n = len(x)
     # optimize
-    negloglike = lambda theta: -np.sum(logpdf(x,theta[0],theta[1]))
+    def negloglike(theta):
+        L = np.sum(countV*logpdf(xV,theta[0],theta[1]))
+        [dmu, dsigma] = dlogpdf(xV,theta[0],theta[1])
+        grad = np.array([np.sum(countV*dmu), np.sum(countV*dsigma)])
+        return (-L, -grad)
     tol = 1E-1
     bnds=[(-n/5,None),(tol,None)]
-    res = op.minimize(negloglike, theta0, bounds=bnds, method='L-BFGS-B')
+    res = fitminimize(negloglike, theta0, bnds, info, fallback=[0, 1])
     theta = res.x
     convstatus = res.success
-    LV = logpdf(x,theta[0], theta[1])
+    LV = logpdf(xV,theta[0], theta[1])[invV]
     return [theta, LV, convstatus]
 
-def plwc(x, alpha0=None):
+def plwc(x, alpha0=None, lam0=None, info=None):
     """ Fits a tail-conditional power-law with exponential cutoff to a data set.
     The data is assumed to begin at xmin. The logpdf is what is calculated and
-    returned, as this is more relevant for likelihood calculations.
+    returned, as this is more relevant for likelihood calculations. The
+    normalization uses ic.plwcconstfast(), whose relative error (below 1E-10,
+    typically 1E-13) moves the fitted parameters by far less than the
+    optimizer's own tolerance.
+
+    The starting point comes from the power-law and exponential fits, unless
+    alpha0 and lam0 are given (lrt.nested() passes the fits it already has).
+
+    The likelihood depends on the data only through sum(log(x)) and sum(x),
+    so each evaluation costs a few normalization constants. Its gradient in
+    lam is exact, since the lam-derivative of C(alpha, lam) is
+    -C(alpha-1, lam); the alpha-derivative of log(C) is a central difference.
 
     Input:
         x           ndarray, ndim = 1, dtype = integer
         alpha0      float, power-law exponent (optional input)
+        lam0        float, exponential rate (optional input)
+        info        dict, if given gets the solver counts, see fitminimize()
 
     Output:
         alpha        float, exponent on x, must be > -1
@@ -277,22 +1085,34 @@ def plwc(x, alpha0=None):
     """
     xmin = np.min(x)
     ntail = len(x)
+    logsum = np.sum(np.log(x))
+    xsum = np.sum(x)
     # define log pdf
     def logpdf(x,alpha, lam):
         xmin = np.min(x)
-        C = ic.plwcconst(alpha,lam, xmin)
+        C = ic.plwcconstfast(alpha,lam, xmin)
         result = -np.log(C) - alpha*np.log(x) - lam*x
         return result
     # Estimates for optimzation
     if alpha0 is None:
         alpha0 = pl(x)[0]
-    lam0 = exp(x)[0]
+    if lam0 is None:
+        lam0 = exp(x)[0]
     theta0 = np.array([alpha0,lam0])
-    # define negative log likelihood, the function we wish to minimize
-    negloglike = lambda theta: -np.sum(logpdf(x,theta[0], theta[1]))
+    # define negative log likelihood, the function we wish to minimize,
+    # returned together with its gradient
+    def negloglike(theta):
+        [alpha, lam] = theta
+        h = 1E-6
+        C = ic.plwcconstfast([alpha, alpha-h, alpha+h, alpha-1], lam, xmin)
+        dlogCdalpha = (np.log(C[2])-np.log(C[1]))/(2*h)
+        dlogCdlam = -C[3]/C[0]
+        L = -ntail*np.log(C[0]) - alpha*logsum - lam*xsum
+        grad = np.array([-ntail*dlogCdalpha - logsum, -ntail*dlogCdlam - xsum])
+        return (-L, -grad)
     tol = 1E-5
     bnds=[(-1+tol,None),(tol,None)]
-    res = op.minimize(negloglike, theta0, bounds=bnds)
+    res = fitminimize(negloglike, theta0, bnds, info)
     # res = op.minimize(negloglike,theta0, method='Nelder-Mead')
     theta = res.x
     convstatus = res.success
@@ -301,15 +1121,21 @@ def plwc(x, alpha0=None):
     LV = logpdf(x,alpha, lam)
     return [alpha, lam, LV, convstatus]
 
-def strexp(x):
+def strexp(x, theta0=None, info=None):
     """ Fits a tail-conditional stretched exponential distribution to a data set.
     The data is assumed to begin at xmin. The logpdf is what is calculated and
     returned, as this is more relevant for likelihood calculations.
     Discretization is done by binning the continuous distrbution
-    (see text for details)
+    (see text for details). The likelihood and its gradient are summed over
+    the distinct values of x weighted by their multiplicities. Unless a warm
+    start is given, the optimizer starts from an estimate based on the
+    moments of log(x).
 
     Input:
         x           ndarray, ndim = 1, dtype = integer
+        theta0      ndarray, [a, b] to start from, e.g. the fit of a related
+                        sequence (optional input)
+        info        dict, if given gets the solver counts, see fitminimize()
 
     Output:
         theta           ndarray, [a,b], dtype=float. a (0<a<1) is the mean of the
@@ -319,6 +1145,8 @@ def strexp(x):
     """
     xmin = np.min(x)
     ntail = len(x)
+    # distinct values, their multiplicities, and the value each point maps to
+    [xV, invV, countV] = np.unique(x, return_inverse=True, return_counts=True)
     # define log pdf
     def initialguessweib(x):
         """
@@ -340,15 +1168,34 @@ def strexp(x):
         g = lambda x: F(x)-F(x+1)
         h = -np.log(F(xmin)+tol_pad)+np.log(g(x)+tol_pad)
         return h
+    # and its derivatives in a and b
+    def dlogpdf(x, a, b, tol_pad = 1E-8):
+        xmin = np.min(x)
+        F = lambda x: np.exp(-(x/b)**a)
+        g = lambda x: F(x)-F(x+1)
+        # with s = (x/b)^a, dF/da = -F s log(x/b) and dF/db = F s a/b
+        def dF(x):
+            s = (x/b)**a
+            return [-F(x)*s*np.log(x/b), F(x)*s*a/b]
+        [da0, db0] = dF(xmin)
+        [da1, db1] = dF(x)
+        [da2, db2] = dF(x+1)
+        da = -da0/(F(xmin)+tol_pad) + (da1-da2)/(g(x)+tol_pad)
+        db = -db0/(F(xmin)+tol_pad) + (db1-db2)/(g(x)+tol_pad)
+        return [da, db]
     # initial estimates
-    # initial estimates
-    theta0 = initialguessweib(x)
+    if theta0 is None:
+        theta0 = initialguessweib(x)
     # optimize
-    negloglike = lambda theta: -np.sum(logpdf(x,theta[0],theta[1]))
+    def negloglike(theta):
+        L = np.sum(countV*logpdf(xV,theta[0],theta[1]))
+        [da, db] = dlogpdf(xV,theta[0],theta[1])
+        grad = np.array([np.sum(countV*da), np.sum(countV*db)])
+        return (-L, -grad)
     tol = 1E-5
     bnds=[(tol,1),(0.01,None)]
-    res = op.minimize(negloglike, theta0, bounds=bnds, method='L-BFGS-B')
+    res = fitminimize(negloglike, theta0, bnds, info)
     theta = res.x
     convstatus = res.success
-    LV = logpdf(x,theta[0], theta[1])
+    LV = logpdf(xV,theta[0], theta[1])[invV]
     return [theta, LV, convstatus]
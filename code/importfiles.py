@@ -1,18 +1,168 @@
 import pandas as pd
 import numpy as np
+import os
+import struct
+import zipfile
 
 
-def readdata(fp):
+def readdata(fp, expand=True):
     """ Reads in a datafile.
 
     Input:
         fp                      string, filepath to csv file (degree sequence).
+        expand                  Boolean, if False return the count form given
+                                by readcounts() instead of repeating the xvals
 
     Output:
         data                    ndarray, ndim = 1, dtype = integer. Repeats each
                                 xval as many times as indicated by counts
     """
 
+    [xvalues, counts] = readcounts(fp)
+    if not expand:
+        return xvalues, counts
+    data = np.repeat(xvalues, counts)
+    return data
+
+def readcounts(fp):
+    """ Reads in a datafile without expanding it.
+
+    Input:
+        fp                      string, filepath to csv file (degree sequence).
+
+    Output:
+        xvalues                 ndarray, ndim = 1, dtype = integer. Distinct
+                                xvals, in the order they appear in the file
+        counts                  ndarray, ndim = 1, dtype = integer. Number of
+                                times each xval occurs
+    """
+
     df = pd.read_csv(fp)
-    data = np.concatenate([np.array([df.xvalue[i] for repeat in range(df.counts[i])]) for i in range(len(df))])
+    xvalues = np.asarray(df.xvalue, dtype=int)
+    counts = np.asarray(df.counts, dtype=int)
+    return xvalues, counts
+
+def packdata(deg_dir, archivefp):
+    """ Packs every degree sequence in a directory (the .txt and .csv files, as
+    in sfanalysis.organize_degree_sequences()) into one binary .npz archive,
+    so that sequences can later be read by name without parsing text. The
+    archive holds the file names, the xvals and counts of all files
+    concatenated, and the offsets at which each file's rows start.
+
+    Input:
+        deg_dir                 string, path to directory of degree sequences
+        archivefp               string, filepath of the archive to write
+
+    Output:
+        names                   ndarray, ndim = 1, dtype = string. File names,
+                                in the order they are stored
+    """
+
+    names = sorted([fn for fn in os.listdir(deg_dir) if fn.split('.')[-1] in
+                                                            ['txt', 'csv']])
+    xvaluesV = []
+    countsV = []
+    for fn in names:
+        [xvalues, counts] = readcounts(os.path.join(deg_dir, fn))
+        xvaluesV.append(xvalues)
+        countsV.append(counts)
+    offsets = np.zeros(len(names)+1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(xvalues) for xvalues in xvaluesV])
+    names = np.array(names)
+    np.savez(archivefp, names=names, offsets=offsets,
+             xvalues=np.concatenate(xvaluesV+[np.zeros(0, dtype=int)]),
+             counts=np.concatenate(countsV+[np.zeros(0, dtype=int)]))
+    return names
+
+def loadarchive(archivefp):
+    """ Loads an archive written by packdata().
+
+    Input:
+        archivefp               string, filepath of the archive
+
+    Output:
+        archive                 dict, with the stored arrays 'names',
+                                'offsets', 'xvalues' and 'counts', and 'index',
+                                a dict from file name to position in names
+    """
+
+    f = np.load(archivefp)
+    archive = dict((key, f[key]) for key in ['names', 'offsets', 'xvalues',
+                                              'counts'])
+    f.close()
+    archive['index'] = dict((fn, i) for i, fn in enumerate(archive['names']))
+    return archive
+
+def opencorpus(archivefp):
+    """ Opens an archive written by packdata() as a shared, read-only corpus.
+    Unlike loadarchive(), the concatenated xvalues and counts are not read in
+    but memory-mapped where np.savez() stored them, so opening is immediate
+    and every process that opens the same archive shares one copy of it in
+    the page cache. Worker processes should open the corpus themselves (e.g.
+    in a pool initializer) or inherit it by fork rather than be sent it, since
+    pickling a memory map copies its data.
+
+    Input:
+        archivefp               string, filepath of the archive
+
+    Output:
+        corpus                  dict, as returned by loadarchive() but with
+                                'xvalues' and 'counts' as read-only np.memmap
+    """
+
+    f = np.load(archivefp)
+    corpus = dict((key, f[key]) for key in ['names', 'offsets'])
+    f.close()
+    corpus['index'] = dict((fn, i) for i, fn in enumerate(corpus['names']))
+    zf = zipfile.ZipFile(archivefp)
+    f = open(archivefp, 'rb')
+    for key in ['xvalues', 'counts']:
+        info = zf.getinfo(key + '.npy')
+        if info.compress_type != zipfile.ZIP_STORED:
+            raise ValueError("%s is compressed in %s and cannot be mapped"
+                             % (key, archivefp))
+        # the member's data follows its local header, whose name and extra
+        # field lengths are at bytes 26-30
+        f.seek(info.header_offset)
+        [namelen, extralen] = struct.unpack('<HH', f.read(30)[26:30])
+        f.seek(info.header_offset + 30 + namelen + extralen)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            [shape, fortran, dtype] = np.lib.format.read_array_header_1_0(f)
+        else:
+            [shape, fortran, dtype] = np.lib.format.read_array_header_2_0(f)
+        if shape[0] == 0:
+            corpus[key] = np.zeros(0, dtype=dtype)
+        else:
+            corpus[key] = np.memmap(archivefp, dtype=dtype, mode='r',
+                                    offset=f.tell(), shape=shape)
+    f.close()
+    zf.close()
+    return corpus
+
+def readpacked(archive, fn, expand=True):
+    """ Reads one degree sequence from an archive, the same way readdata()
+    reads it from its file. With expand=False on a corpus from opencorpus(),
+    xvalues and counts are views of the memory map, not copies.
+
+    Input:
+        archive                 dict, as returned by loadarchive() or
+                                opencorpus()
+        fn                      string, file name of the degree sequence
+        expand                  Boolean, if False return xvalues and counts as
+                                in readcounts()
+
+    Output:
+        data                    ndarray, ndim = 1, dtype = integer. Repeats each
+                                xval as many times as indicated by counts
+    """
+
+    i = archive['index'][fn]
+    start = archive['offsets'][i]
+    stop = archive['offsets'][i+1]
+    xvalues = archive['xvalues'][start:stop]
+    counts = archive['counts'][start:stop]
+    if not expand:
+        return xvalues, counts
+    data = np.repeat(xvalues, counts)
     return data
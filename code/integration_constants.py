@@ -1,15 +1,19 @@
 import mpmath as mp
 import numpy as np
+import scipy.special as sp
 
 """ Contains functions to compute the normalization constants for both power-law
 and power-law with expoenential cutoff. Both functions are meant to be called
 directly.
 
 Note that plwcconstant returns a constant to divide by, while plconst returns
-a constant to multiply.
+a constant to multiply. plwcconstfast() computes the same constant as
+plwcconst() in double precision, for arrays of parameters at once.
 
 """
 
+# Gauss-Legendre quadrature on [-1, 1] used by plwcconstfast()
+[GLNODES, GLWEIGHTS] = np.polynomial.legendre.leggauss(96)
 
 
 def plwcconst(alpha, lam, xmin):
@@ -49,6 +53,81 @@ def plwcconst(alpha, lam, xmin):
     C = float(result)
     return C
 
+def plwcconstfast(alpha, lam, xmin, rtol=1E-10):
+    """ Computes the same normalization constant as plwcconst(), i.e. the sum
+
+        C = sum from xmin to infinity of ( x^(-alpha) * e^(-lam x) )
+
+    in double precision and for whole arrays of (alpha, lam, xmin) at once.
+    The first nhead terms are summed directly. The rest of the sum, from
+    M = xmin + nhead on, is given by the Euler-Maclaurin formula
+
+        integral from M to infinity of f + f(M)/2 - f1(M)/12 + f3(M)/720
+            - f5(M)/30240
+
+    where f(x) = x^(-alpha) * e^(-lam x) and fk is its k-th derivative. The
+    integral is done by Gauss-Legendre quadrature after substituting
+    x = M e^u, which turns its slowly decaying power-law part into an
+    exponential one. The last correction term is used as the error estimate;
+    wherever it exceeds rtol*C (or lam <= 0) the constant is computed by
+    plwcconst() instead. Against plwcconst() the relative error is typically
+    below 1E-13 for -1 < alpha <= 20, 1E-12 <= lam <= 30 and
+    1 <= xmin <= 1E5.
+
+    Inputs:
+        alpha                  float or array, exponent on x, must be > -1
+        lam                    float or array, exponential cutoff, must be > 0
+        xmin                   int or array, starting point for sum, must be >= 1
+        rtol                   float, largest estimated relative error accepted
+                               before falling back to plwcconst()
+
+    Outputs:
+        C                      float or array (shape of the broadcast inputs),
+                               normalization constant
+
+    """
+    nhead = 32
+    [alpha, lam, xmin] = np.broadcast_arrays(np.asarray(alpha, dtype=float),
+                                             np.asarray(lam, dtype=float),
+                                             np.asarray(xmin, dtype=float))
+    shape = alpha.shape
+    alpha = alpha.ravel()
+    lam = lam.ravel()
+    xmin = xmin.ravel()
+    # direct sum of the first nhead terms
+    x = xmin[:,None] + np.arange(nhead)[None,:]
+    head = np.sum(x**(-alpha[:,None])*np.exp(-lam[:,None]*x), axis=1)
+    # integral of the rest. With x = M e^u it is M^(1-alpha) e^(-lam M) times
+    # the integral over u >= 0 of exp((1-alpha) u - lam M (e^u - 1)), which is
+    # negligible beyond lam M (e^u - 1) = 60
+    M = xmin + nhead
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        umax = np.log1p(60./(lam*M))
+        u = (GLNODES[None,:]+1)/2*umax[:,None]
+        g = np.exp((1-alpha[:,None])*u - (lam*M)[:,None]*np.expm1(u))
+        f = M**(-alpha)*np.exp(-lam*M)
+        integral = M*f*np.sum(GLWEIGHTS[None,:]*g, axis=1)*umax/2
+        # derivatives of f, from those of log f = -alpha log(x) - lam x
+        h = -alpha/M - lam
+        h1 = alpha/M**2
+        h2 = -2*alpha/M**3
+        h3 = 6*alpha/M**4
+        h4 = -24*alpha/M**5
+        f1 = f*h
+        f3 = f*(h**3 + 3*h*h1 + h2)
+        f5 = f*(h**5 + 10*h**3*h1 + 10*h**2*h2 + 15*h*h1**2 + 5*h*h3 +
+                10*h1*h2 + h4)
+        C = head + integral + f/2 - f1/12 + f3/720 - f5/30240
+        bad = ~(np.abs(f5/30240) <= rtol*C) | ~(lam > 0)
+    # C == 0 means the sum underflows, as it also does in plwcconst()
+    bad &= C != 0
+    for i in np.nonzero(bad)[0]:
+        C[i] = plwcconst(alpha[i], lam[i], int(xmin[i]))
+    C = C.reshape(shape)
+    if C.ndim == 0:
+        C = float(C)
+    return C
+
 def plconst(alpha, xmin):
     """ Computes the normalization constant on the discrete power law;
     i.e., computes C so that
@@ -72,20 +151,23 @@ def plconst(alpha, xmin):
           function. (Our alpha is s in the notation above).
 
 
+    The zeta function is scipy's Hurwitz zeta, which takes arrays, so one call
+    gives the constants for a whole batch of (alpha, xmin) pairs.
+
     Inputs:
-        alpha                  array, shape=(1,) exponent on x, must be > 1
-                               must be passed as array for op.minimize()
-        xmin                   int, starting point for sum, must be >= 1
+        alpha                  float or array, exponent on x, must be > 1.
+                               op.minimize() passes an array of shape (1,)
+        xmin                   int or array, starting point for sum, must be >= 1
 
     Outputs:
-        C                      float, normalization constant
+        C                      float, or array of the broadcast shape of alpha
+                               and xmin, normalization constant
 
     """
-    total = mp.zeta(np.asscalar(alpha),1) # op.minimize passes array
-    lowertail = np.sum(np.asarray(range(1,xmin)**(-alpha)))
-    result = total-lowertail
-    C = 1./(result)
-    return float(C)
+    C = 1./sp.zeta(np.asarray(alpha, dtype=float), xmin)
+    if C.ndim == 0:
+        C = float(C)
+    return C
 
 
 
@@ -1,4 +1,6 @@
 import numpy as np
+import multiprocessing
+import multiprocessing.pool
 import scipy.optimize as op
 import scipy.special as sp
 import integration_constants as ic
@@ -8,7 +10,9 @@ from scipy.stats import norm, chi2
 
 """ Contains functions used in likelihood ratio tests, comparing the power-law
 fit with alternative distributions. All can be called directly, but nested() and
-nonnested() are the only we use.
+nonnested() are the only we use. Given the same memo dict (see fit.fitmemo()),
+they share the power-law log-pdf and every fitted model instead of recomputing
+them.
 
 """
 
@@ -25,7 +29,7 @@ def pllogpdf(x,alpha):
         logpdf          float, point-wise log pdf
 
     """
-    logpdf = np.log(ic.plconst(np.array([alpha]), np.min(x))) -alpha*np.log(x)
+    logpdf = np.log(ic.plconst(alpha, np.min(x))) -alpha*np.log(x)
     return logpdf
 
 def vuong(LplV, LaltV):
@@ -119,7 +123,7 @@ def decidenested(logratio, p, decisionthresh):
         d = 0
     return d
 
-def exp(x, LplV, decisionthresh):
+def exp(x, LplV, decisionthresh, memo=None):
     """
     Perform likelihood ratio test for exponetial distribution. First fits an
     exponential distribution to the data. A Vuong statistic is calculated from
@@ -131,6 +135,7 @@ def exp(x, LplV, decisionthresh):
         LplV                ndarray, pointwise likelihood values for power-law fit
         decisionthresh      float, threshold for rejecting.
                                 Default in paper is decisionthresh = 0.1
+        memo                dict, earlier fits on x, see fit.fitmemo()
 
     Output:
         dexp                int, decision about exponential distribution
@@ -138,7 +143,7 @@ def exp(x, LplV, decisionthresh):
     # perform lrt: Log-likelihood ratio between discrete power law and
     # exponential distribution. This is done pointwise so that we can use
     # Vuong's statistic to estimate the variance in the ratio
-    [lam, LexpV, convstatus] = fit.exp(x)
+    [lam, LexpV, convstatus] = fit.fitmemo(memo, fit.exp, x)
     if convstatus == True:
         R, p, normR = vuong(LplV, LexpV)
         # check if statistically significant
@@ -147,7 +152,7 @@ def exp(x, LplV, decisionthresh):
         dexp = 2
     return dexp
 
-def ln(x,LplV, decisionthresh):
+def ln(x,LplV, decisionthresh, memo=None):
     """
     Perform likelihood ratio test for log normal distribution. First
     fits a log normal distribution to the data. A Vuong statistic is
@@ -159,11 +164,12 @@ def ln(x,LplV, decisionthresh):
         LplV                ndarray, pointwise loglikelihood for power-law fit
         decisionthresh      float, threshold for rejecting.
                                 Default in paper is decisionthresh = 0.1
+        memo                dict, earlier fits on x, see fit.fitmemo()
 
     Output:
         dln                 int, decision about log-normal distribution
     """
-    [theta,LlnV, convstatus] = fit.ln(x)
+    [theta,LlnV, convstatus] = fit.fitmemo(memo, fit.ln, x)
     if convstatus == True:
         R, p, normR = vuong(LplV, LlnV)
         # check if statistically significant
@@ -172,7 +178,7 @@ def ln(x,LplV, decisionthresh):
         dln = 2
     return dln
 
-def strexp(x,LplV, decisionthresh):
+def strexp(x,LplV, decisionthresh, memo=None):
     """
     Perform likelihood ratio test for stretched exponetial (Weibull)
     distribution. First fits a stretched exponential distribution to the data,
@@ -184,11 +190,12 @@ def strexp(x,LplV, decisionthresh):
         LplV                ndarray, pointwise loglikelihood for power-law fit
         decisionthresh      float, threshold for rejecting.
                                 Default in paper is decisionthresh = 0.1
+        memo                dict, earlier fits on x, see fit.fitmemo()
 
     Output:
         dstrexp             int, decision about exponential distribution
     """
-    [theta, LstrexpV, convstatus] = fit.strexp(x)
+    [theta, LstrexpV, convstatus] = fit.fitmemo(memo, fit.strexp, x)
     if convstatus == True:
         R, p, normR = vuong(LplV, LstrexpV)
         # check if statistically significant
@@ -197,7 +204,7 @@ def strexp(x,LplV, decisionthresh):
         dstrexp = 2
     return dstrexp
 
-def nested(x, alpha, decisionthresh=0.1):
+def nested(x, alpha, decisionthresh=0.1, memo=None):
     """
     Perform likelihood ratio tests for alternative distributions that are in
     the power law family.
@@ -208,6 +215,8 @@ def nested(x, alpha, decisionthresh=0.1):
         alpha               float, best fit power-law parameter
         decisionthresh      float, threshold for rejecting null hypothesis
                                 Default is 0.1
+        memo                dict, fits and log-pdfs already found for x,
+                                shared with nonnested(); see fit.fitmemo()
 
     Output:
         dplwc    int, decision about power law with exponential cutoff
@@ -215,10 +224,11 @@ def nested(x, alpha, decisionthresh=0.1):
                                     0  -   inconclusive
                                    -1  -   alternative dist better
     """
-    LplV = pllogpdf(x,alpha)
+    LplV = fit.fitmemo(memo, pllogpdf, x, alpha)
     Lpl = np.sum(LplV)
-    # compare plwc
-    [alpha, lam, LplwcV, convstatus] = fit.plwc(x, alpha)
+    # compare plwc, starting from the power-law and exponential fits
+    lam0 = fit.fitmemo(memo, fit.exp, x)[0]
+    [alpha, lam, LplwcV, convstatus] = fit.fitmemo(memo, fit.plwc, x, alpha, lam0)
     if convstatus == True:
         Lplwc = np.sum(LplwcV)
         R = Lpl-Lplwc
@@ -228,7 +238,7 @@ def nested(x, alpha, decisionthresh=0.1):
         dplwc = 2
     return dplwc
 
-def nonnested(x, alpha, decisionthresh=0.1):
+def nonnested(x, alpha, decisionthresh=0.1, memo=None):
     """
     Perform likelihood ratio tests for alternative distributions that are not
     in the power law family.
@@ -239,6 +249,8 @@ def nonnested(x, alpha, decisionthresh=0.1):
         alpha               float, best fit power-law parameter
         decisionthresh      float, threshold for rejecting null hypothesis
                                         Default is 0.1
+        memo                dict, fits and log-pdfs already found for x,
+                                shared with nested(); see fit.fitmemo()
 
     Output:
         dexp                int, decision about exponential distribution
@@ -248,12 +260,101 @@ def nonnested(x, alpha, decisionthresh=0.1):
                                                 0  -   inconclusive
                                                -1  -   alternative dist better
     """
-    LplV = pllogpdf(x,alpha)
+    LplV = fit.fitmemo(memo, pllogpdf, x, alpha)
     # compare exponential
-    dexp = exp(x,LplV, decisionthresh)
+    dexp = exp(x,LplV, decisionthresh, memo)
     # compare log normal
-    dln = ln(x,LplV, decisionthresh)
+    dln = ln(x,LplV, decisionthresh, memo)
     # compare stretched exponential
-    dstrexp = strexp(x,LplV, decisionthresh)
+    dstrexp = strexp(x,LplV, decisionthresh, memo)
 
     return [dexp, dln, dstrexp]
+
+def alternatives(x, alpha, decisionthresh=0.1, memo=None, workers=1,
+                 executor='process', pool=None):
+    """
+    Perform the likelihood ratio tests of nonnested() and nested() together.
+    The log-normal, stretched exponential and power law with exponential
+    cutoff fits do not depend on each other, so with workers > 1 (or a pool)
+    they run concurrently and the tests take as long as the slowest fit. The
+    exponential fit is made first, since it is fast and is the starting point
+    of the cutoff fit. Results are stored in memo, so nonnested() and nested()
+    then only compare likelihoods.
+
+    Input:
+        x                   ndarray, data set to be fit. Assumed to only have
+                                values above the best fit xmin value (from PL)
+        alpha               float, best fit power-law parameter
+        decisionthresh      float, threshold for rejecting null hypothesis
+                                        Default is 0.1
+        memo                dict, fits and log-pdfs already found for x; see
+                                fit.fitmemo()
+        workers             int, number of fits run at once. 1 runs them in turn
+        executor            string, 'thread' or 'process', kind of pool made
+                                when workers > 1 and no pool is given
+        pool                multiprocessing.Pool or multiprocessing.pool.ThreadPool,
+                                used instead of making a new pool, e.g. one
+                                from fitpool() reused across degree sequences
+
+    Output:
+        [dexp, dln, dstrexp]    list, decisions of nonnested()
+        dplwc                   int, decision of nested()
+    """
+    if memo is None:
+        memo = {}
+    if workers > 1 or pool is not None:
+        lam0 = fit.fitmemo(memo, fit.exp, x)[0]
+        tasks = [[fit.ln, x, ()], [fit.strexp, x, ()],
+                 [fit.plwc, x, (alpha, lam0)]]
+        tasks = [task for task in tasks
+                 if fit.fitkey(task[0], task[1], *task[2]) not in memo]
+        if pool is None:
+            newpool = fitpool(workers, executor)
+        else:
+            newpool = pool
+        try:
+            results = newpool.map(fitone, tasks)
+        finally:
+            if pool is None:
+                newpool.close()
+                newpool.join()
+        for task, result in zip(tasks, results):
+            memo[fit.fitkey(task[0], task[1], *task[2])] = result
+    dV = nonnested(x, alpha, decisionthresh, memo)
+    dplwc = nested(x, alpha, decisionthresh, memo)
+    return [dV, dplwc]
+
+def fitpool(workers, executor='process'):
+    """ Makes a pool for alternatives(). The fits hold the interpreter lock
+    for most of their time (scipy's optimizers call back into Python for every
+    evaluation), so only processes run them at once. Threads are for pools
+    made inside the workers of another multiprocessing.Pool, which cannot
+    start processes of their own.
+
+    Input:
+        workers             int, number of threads or processes
+        executor            string, 'thread' or 'process'
+
+    Output:
+        pool                multiprocessing.pool.ThreadPool or multiprocessing.Pool
+    """
+    if executor == 'thread':
+        pool = multiprocessing.pool.ThreadPool(workers)
+    elif executor == 'process':
+        pool = multiprocessing.Pool(workers)
+    else:
+        raise ValueError("executor must be 'thread' or 'process'")
+    return pool
+
+def fitone(task):
+    """ Runs one fit for alternatives(). A separate function so that process
+    pools can pickle it.
+
+    Input:
+        task        list, [func, x, args] to call func(x, *args)
+
+    Output:
+        result      whatever func(x, *args) returns
+    """
+    [func, x, args] = task
+    return func(x, *args)
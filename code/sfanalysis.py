@@ -6,51 +6,231 @@ import numpy as np
 import pandas as pd
 import igraph
 import os
+import re
 import collections
+import hashlib
+import sqlite3
+import time
+import functools
+import itertools
+import multiprocessing
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 
 
 
-def buildGMLcatalog(gml_dir):
+def buildGMLcatalog(gml_dir, workers=1, cachedb=None):
     """ Walks through the subdirectories of a root to find all gml files, then
-    catalogs the relevant information about the contained networks.
+    catalogs the relevant information about the contained networks. With
+    workers > 1 the files are read in a process pool, the largest first.
+
+    With cachedb, the information about each file is kept in an SQLite
+    database (see opencatalog()) together with the file's size and
+    modification time, and files unchanged since are taken from it instead of
+    being read again, so that only new or changed files are read.
 
     Input:
         gmldirpath              string, path to the root directory where gmls are
-
-
+        workers                 int, number of files read at once
+        cachedb                 string, filepath of the SQLite database of
+                                cataloged files (optional input)
 
     Output:
         df                      DataFrame, catalog of the existing gml files
 
     """
-    df = pd.DataFrame(columns=['fp_gml', 'Weighted', 'Directed', 'Bipartite',
-                               'Multigraph', 'Multiplex'])
-    # make list of file paths to gmls
-    fpV = []
-    for root, dirs, files in os.walk(gml_dir):
-        for name in files:
-            # leave out the bipartite projections so we can make our own
-            if name.endswith('.gml'):
-                fpV.append(os.path.join(root, name))
+    fpV = findgmls(gml_dir)
+    # take the files unchanged since they were cached
+    if cachedb is not None:
+        conn = opencatalog(cachedb)
+    else:
+        conn = None
+    [records, fingerprints] = freshrecords(fpV, conn)
+    # read the rest, largest first
+    todo = [fp for fp in fpV if fp not in records]
+    todo.sort(key=lambda fp: -fingerprints[fp][0])
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(catalogrecord, todo)
+    else:
+        pool = None
+        results = itertools.imap(catalogrecord, todo)
+    notesbyfp = {}
+    try:
+        for [fp, record, notes] in results:
+            records[fp] = record
+            notesbyfp[fp] = notes
+            if cachedb is not None:
+                storecatalog(conn, fp, fingerprints[fp], record)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if conn is not None:
+            conn.close()
+    if conn is not None:
+        print '%d gml files, %d read and %d taken from the cache' \
+            %(len(fpV), len(todo), len(fpV)-len(todo))
+    # the error lines of the files read, in the order they were found
+    for fp in fpV:
+        for [errorfile, errormessage] in notesbyfp.get(fp, []):
+            sg.writeerror(errormessage, errorfile)
     # create the catalog
+    rows = collections.OrderedDict()
     for fp in fpV:
-        g = igraph.read(fp)
         splitfp = fp.split('/')
         name = splitfp[-1]
         # add new row or overwrite existing row
-        df.loc[name] = np.nan
-        df.loc[name]['fp_gml'] = fp
-        df.loc[name]['Weighted'] = sg.weighted(g, fp)
-        df.loc[name]['Directed'] = sg.directed(g)
-        df.loc[name]['Bipartite'] = sg.bipartite(g, fp)
-        df.loc[name]['Multigraph'] = sg.multigraph(g)
-        df.loc[name]['Multiplex'] = sg.multiplex(g)
-        if (df.loc[name] == 'error').any():
+        rows[name] = dict(records[fp], fp_gml=fp)
+        if 'error' in rows[name].values():
             # this catches bad bipartite gmls
-            df = df.drop(name)
+            del rows[name]
             print('dropping {} from the considered gmls'.format(name))
+    df = pd.DataFrame(rows.values(), index=rows.keys(),
+                      columns=['fp_gml'] + CATALOGCOLUMNS)
     return df
 
+def findgmls(gml_dir):
+    """ Walks through the subdirectories of a root to find all gml files.
+
+    Input:
+        gml_dir                 string, path to the root directory where gmls are
+
+    Output:
+        fpV                     list, paths to the gml files
+    """
+    # make list of file paths to gmls
+    fpV = []
+    for root, dirs, files in os.walk(gml_dir):
+        for name in files:
+            # leave out the bipartite projections so we can make our own
+            if name.endswith('.gml'):
+                fpV.append(os.path.join(root, name))
+    return fpV
+
+def catalogrecord(fp):
+    """ Reads one gml file and finds what buildGMLcatalog() keeps about it.
+    This can run in a worker process, so the lines for the error file are
+    returned for the parent to write rather than written here.
+
+    Input:
+        fp                      string, path to the gml file
+
+    Output:
+        fp                      string, path to the gml file
+        record                  dict, as returned by classifygraph()
+        notes                   list, [errorfile, errormessage] pairs for
+                                sg.writeerror()
+    """
+    g = igraph.read(fp)
+    [record, notes] = sg.holderrors(classifygraph, g, fp)
+    return [fp, record, notes]
+
+def classifygraph(g, fp):
+    """ Runs the checks of sortgmls on a graph read from a gml file.
+
+    Input:
+        g                       igraph object, the graph
+        fp                      string, path to the gml file, for error files
+
+    Output:
+        record                  dict, value for each of CATALOGCOLUMNS. 'error'
+                                means the gml file is not structured correctly
+    """
+    record = {}
+    record['Weighted'] = sg.weighted(g, fp)
+    record['Directed'] = sg.directed(g)
+    record['Bipartite'] = sg.bipartite(g, fp)
+    record['Multigraph'] = sg.multigraph(g)
+    record['Multiplex'] = sg.multiplex(g)
+    return record
+
+""" Functions for the cache of cataloged gml files used by buildGMLcatalog() """
+# catalog columns found by reading the gml file
+CATALOGCOLUMNS = ['Weighted', 'Directed', 'Bipartite', 'Multigraph', 'Multiplex']
+
+def opencatalog(dbfp):
+    """ Opens (and if needed creates) the SQLite database of cataloged gml
+    files. It has one row per file, with its size and modification time when
+    it was read and the columns in CATALOGCOLUMNS. These are INTEGER columns,
+    but SQLite keeps an 'error' as it is.
+
+    Input:
+        dbfp                    string, filepath of the database
+
+    Output:
+        conn                    sqlite3.Connection
+    """
+    conn = sqlite3.connect(dbfp)
+    cols = ', '.join(['%s INTEGER' %col for col in CATALOGCOLUMNS])
+    conn.execute('CREATE TABLE IF NOT EXISTS catalog (fp TEXT PRIMARY KEY, '
+                 'size INTEGER, mtime REAL, %s)' %cols)
+    conn.commit()
+    return conn
+
+def storecatalog(conn, fp, fingerprint, record):
+    """ Commits what classifygraph() found about one gml file to the database,
+    replacing any earlier entry.
+
+    Input:
+        conn                    sqlite3.Connection, from opencatalog()
+        fp                      string, path to the gml file
+        fingerprint             tuple, (size, mtime) of the file when it was read
+        record                  dict, as returned by classifygraph()
+    """
+    values = [fp, fingerprint[0], fingerprint[1]]
+    values += [record[col] for col in CATALOGCOLUMNS]
+    cols = ['fp', 'size', 'mtime'] + CATALOGCOLUMNS
+    conn.execute('INSERT OR REPLACE INTO catalog (%s) VALUES (%s)'
+                 %(', '.join(cols), ', '.join(['?']*len(values))), values)
+    conn.commit()
+
+def freshrecords(fpV, conn=None):
+    """ Finds the gml files whose size and modification time are the same as
+    when they were cataloged.
+
+    Input:
+        fpV                     list, paths to the gml files
+        conn                    sqlite3.Connection, from opencatalog(). If None
+                                no file is fresh
+
+    Output:
+        records                 dict, path to gml file -> record as returned by
+                                classifygraph(), for the fresh files only
+        fingerprints            dict, path to gml file -> (size, mtime) now,
+                                for every file
+    """
+    if conn is not None:
+        cached = loadcatalog(conn)
+    else:
+        cached = {}
+    records = {}
+    fingerprints = {}
+    for fp in fpV:
+        stat = os.stat(fp)
+        fingerprints[fp] = (stat.st_size, stat.st_mtime)
+        if fp in cached and cached[fp][0] == fingerprints[fp]:
+            records[fp] = cached[fp][1]
+    return [records, fingerprints]
+
+def loadcatalog(conn):
+    """ Reads every cataloged gml file from the database.
+
+    Input:
+        conn                    sqlite3.Connection, from opencatalog()
+
+    Output:
+        cached                  dict, path to gml file -> [(size, mtime), record]
+                                with record as returned by classifygraph()
+    """
+    cached = {}
+    cursor = conn.execute('SELECT fp, size, mtime, %s FROM catalog'
+                          %', '.join(CATALOGCOLUMNS))
+    for line in cursor:
+        cached[line[0]] = [(line[1], line[2]),
+                           dict(zip(CATALOGCOLUMNS, line[3:]))]
+    return cached
+
 """
 The functions here are designed to take cataloged gml files, extract
 corresponding simple degree sequences, and store basic information about each
@@ -75,15 +255,8 @@ def writeerror_deg(errormessage, size):
         errorfp = 'degseqerror_small.txt'
     elif size=='big':
         errorfp = 'degseqerror_big.txt'
-    known = False
-    f = open(errorfp, 'a+')
-    f.seek(0)
-    for line in f:
-        if line == errormessage:
-            known = True
-    if not known:
-        f.write(errormessage)
-    f.close()
+    # held back like the gml errors inside sg.holderrors()
+    sg.writeerror(errormessage, errorfp)
 
 def readdeg(g, fp, degdir, analysis, namekey='', bipkey=0, weighkey=0, dirkey=0, mgkey=0, mpkey=0):
     """ Reads in an igraph object and writes the degree sequence to a text file.
@@ -123,6 +296,25 @@ def readdeg(g, fp, degdir, analysis, namekey='', bipkey=0, weighkey=0, dirkey=0,
         deg = g.outdegree()
     else:
         print 'something is wrong with your dirkey'
+    writedeg(deg, g.ecount(), fp, degdir, analysis, namekey=namekey,
+             bipkey=bipkey, weighkey=weighkey, dirkey=dirkey, mgkey=mgkey,
+             mpkey=mpkey)
+
+def writedeg(deg, numedges, fp, degdir, analysis, namekey='', bipkey=0,
+             weighkey=0, dirkey=0, mgkey=0, mpkey=0):
+    """ Writes a degree sequence to a text file, as readdeg() does for a graph,
+    and adds its row to analysis.
+
+    Input:
+        deg                     list or ndarray, degree of each vertex
+        numedges                int, number of edges of the graph
+        fp, degdir, analysis, namekey, bipkey, weighkey, dirkey, mgkey, mpkey
+                                see readdeg()
+
+    Output:
+        degfile                 output is written to a text file, not returned
+
+    """
     # get file name
     splitfp = fp.split('/')
     if len(splitfp)>1:
@@ -149,9 +341,9 @@ def readdeg(g, fp, degdir, analysis, namekey='', bipkey=0, weighkey=0, dirkey=0,
         writeerror_deg(errormessage, 'small')
     else:
         # write degree sequence file. Each row is xvalue,count
-        count_dict = sorted(collections.Counter(deg).items())
-        numedges = g.ecount()
-        df = pd.DataFrame(count_dict, columns = ['xvalue', 'counts'])
+        [xvalues, counts] = np.unique(deg, return_counts=True)
+        df = pd.DataFrame({'xvalue': xvalues, 'counts': counts},
+                          columns = ['xvalue', 'counts'])
         csvfile = degdir+fn
         df.to_csv(csvfile, index=False)
         # add new line to the data frame if not already in index
@@ -179,6 +371,108 @@ def processdirected(g, fp, degdir, analysis,  namekey='', bipkey=0, mpkey=0, wei
         newnamekey = namekey+dirnamekey
         readdeg(g,fp,degdir, analysis, namekey=newnamekey, bipkey=bipkey, weighkey=weighkey, dirkey=dirkey, mgkey=0, mpkey=mpkey)
 
+def edgearrays(g):
+    """ Pulls the edge list of a graph into arrays, so that the degree sequences
+    of its layers and weight thresholds can be found from masks over its edges
+    (see maskeddegrees()) instead of from copies of the subgraphs.
+
+    Input:
+        g                       igraph object, the graph
+
+    Output:
+        source                  ndarray, first vertex of each edge
+        target                  ndarray, second vertex of each edge
+    """
+    edges = np.asarray(g.get_edgelist(), dtype=int).reshape(-1, 2)
+    return [edges[:,0], edges[:,1]]
+
+def edgecodes(n, source, target, directed):
+    """ One integer per edge that is the same for edges between the same pair
+    of vertices (in the same direction, if directed).
+    """
+    if not directed:
+        [source, target] = [np.minimum(source, target), np.maximum(source, target)]
+    return source*n + target
+
+def maskeddegrees(n, source, target, directed, mask=None, dirkey=0,
+                  simplify=False):
+    """ Finds the degree sequence of the subgraph made of the edges in mask
+    without making it: like g.subgraph_edges() it has only the vertices these
+    edges touch, and with simplify its loops and multiple edges are dropped
+    like g.simplify() does. The degrees are counted with np.bincount().
+
+    Input:
+        n                       int, number of vertices of the whole graph
+        source, target          ndarray, edges of the whole graph, see
+                                edgearrays()
+        directed                Boolean, True if the graph is directed
+        mask                    ndarray, dtype = bool, edges of the subgraph.
+                                If None, the whole graph with all its vertices
+        dirkey                  0 or 'total', 'in' or 'out', see readdeg()
+        simplify                Boolean, if True drop loops and multiple edges
+
+    Output:
+        deg                     ndarray, degree of each vertex of the subgraph
+        numedges                int, number of edges of the subgraph
+    """
+    if mask is None:
+        keep = np.ones(n, dtype=bool)
+    else:
+        [source, target] = [source[mask], target[mask]]
+        keep = np.zeros(n, dtype=bool)
+        keep[source] = True
+        keep[target] = True
+    if simplify:
+        codes = np.unique(edgecodes(n, source, target, directed)[source != target])
+        [source, target] = [codes // n, codes % n]
+    if dirkey == 'in':
+        deg = np.bincount(target, minlength=n)
+    elif dirkey == 'out':
+        deg = np.bincount(source, minlength=n)
+    else:
+        deg = np.bincount(source, minlength=n) + np.bincount(target, minlength=n)
+    return [deg[keep], len(source)]
+
+def readmasked(n, source, target, directed, fp, degdir, analysis, mask=None,
+               simplify=False, namekey='', bipkey=0, weighkey=0, mgkey=0,
+               mpkey=0):
+    """ Writes the degree sequences of the subgraph made of the edges in mask
+    (see maskeddegrees()), as processdirected() would if it is directed and
+    readdeg() otherwise.
+
+    Input:
+        n, source, target, directed, mask, simplify
+                                see maskeddegrees()
+        fp, degdir, analysis, namekey, bipkey, weighkey, mgkey, mpkey
+                                see readdeg()
+    """
+    if directed:
+        keyV = [('in', '_directedin'), ('out','_directedout'), ('total', '_directedtotal')]
+        for dirkey, dirnamekey in keyV:
+            [deg, numedges] = maskeddegrees(n, source, target, directed, mask,
+                                            dirkey, simplify)
+            writedeg(deg, numedges, fp, degdir, analysis,
+                     namekey=namekey+dirnamekey, bipkey=bipkey,
+                     weighkey=weighkey, dirkey=dirkey, mgkey=0, mpkey=mpkey)
+    else:
+        [deg, numedges] = maskeddegrees(n, source, target, directed, mask,
+                                        simplify=simplify)
+        writedeg(deg, numedges, fp, degdir, analysis, namekey=namekey,
+                 bipkey=bipkey, weighkey=weighkey, mgkey=mgkey, mpkey=mpkey)
+
+def isbipartite(n, source, target):
+    """ Checks whether the graph with these edges is bipartite, like
+    g.is_bipartite(). A graph is bipartite if and only if no vertex is
+    connected to its own copy in the bipartite double cover, which has two
+    copies of each vertex and joins each end of an edge to the other copy of
+    the other end.
+    """
+    rows = np.concatenate([source, source+n])
+    cols = np.concatenate([target+n, target])
+    cover = coo_matrix((np.ones(len(rows)), (rows, cols)), shape=(2*n, 2*n))
+    [ncomponents, labels] = connected_components(cover, directed=False)
+    return not np.any(labels[:n] == labels[n:])
+
 def find_threshold(weights, target_num_edges, left=0):
     """ Given a target number of edges in a new subgraph and a list of current
     edge weights, finds the threshold needed to achieve this target edge count.
@@ -220,10 +514,13 @@ def find_threshold(weights, target_num_edges, left=0):
     thresh= uniqueweights[mid]
     return thresh, mid
 
-def oneweighted(g, fp, degdir, analysis, weights, thresh, namekey, weighkey):
+def oneweighted(g, fp, degdir, analysis, weights, thresh, namekey, weighkey,
+                edges=None):
     """ Processes a single weighted graph. Pulls out the list of edges with
-    weight above the minimum threshold "thresh", creates a new subgraph from
-    these edges, then checks for directedness and connectedness.
+    weight above the minimum threshold "thresh", then writes the degree
+    sequences of the subgraph they make, checking for directedness. The
+    degrees are counted from the edge arrays rather than from a copy of the
+    subgraph (see readmasked()).
 
     Input:
         weights             ndarray, edge weights in the order corresponding to
@@ -232,14 +529,16 @@ def oneweighted(g, fp, degdir, analysis, weights, thresh, namekey, weighkey):
                             weight < thresh are discarded
         weighkey            string, indicates which thresholding algorithm was
                             used
+        edges               list, [source, target] from edgearrays(g), to
+                            share between thresholds (optional input)
 
     """
-    edgeseq = g.es(weight_gt=thresh)
-    subg = g.subgraph_edges(edgeseq)
-    if subg.is_directed():
-        processdirected(subg,fp,degdir,analysis, namekey=namekey,weighkey=weighkey)
-    else:
-        readdeg(subg,fp,degdir,analysis, namekey=namekey,weighkey=weighkey)
+    if edges is None:
+        edges = edgearrays(g)
+    [source, target] = edges
+    readmasked(g.vcount(), source, target, g.is_directed(), fp, degdir,
+               analysis, mask=weights > thresh, namekey=namekey,
+               weighkey=weighkey)
 
 def processweighted(g, fp, degdir, analysis):
     """ Processes a weighted graph. This is only for graphs that are not
@@ -251,13 +550,14 @@ def processweighted(g, fp, degdir, analysis):
         g.es['weight'] = g.es['value']
     weights = np.asarray(g.es['weight'])
     n = g.vcount()
+    edges = edgearrays(g)
 
     # w1: want <k>=sqrt(n), so m=(1/2)n^(3/2)
     namekey = '_weighted1'
     weighkey = 'w1'
     target_num_edges = (float(n)**(1.5))/2
     thresh1, ind1 = find_threshold(weights, target_num_edges)
-    oneweighted(g, fp, degdir, analysis, weights,thresh1, namekey=namekey, weighkey=weighkey)
+    oneweighted(g, fp, degdir, analysis, weights,thresh1, namekey=namekey, weighkey=weighkey, edges=edges)
 
     # w2: want <k> in between 2 and sqrt(n)
     namekey = '_weighted2'
@@ -266,7 +566,7 @@ def processweighted(g, fp, degdir, analysis):
     thresh2, ind2 = find_threshold(weights, target_num_edges, left=ind1)
     # if the threshold is the same, don't rewrite the deg seqs
     if ind2 > ind1:
-        oneweighted(g, fp, degdir, analysis, weights,thresh2, namekey, weighkey)
+        oneweighted(g, fp, degdir, analysis, weights,thresh2, namekey, weighkey, edges)
 
     # w3: want <k>=2, so m=n
     namekey = '_weighted3'
@@ -275,7 +575,7 @@ def processweighted(g, fp, degdir, analysis):
     thresh3, ind3 = find_threshold(weights, target_num_edges, left=ind2)
     # if the threshold is the same, don't rewrite the deg seqs
     if ind3 > ind2:
-        oneweighted(g, fp, degdir, analysis, weights,thresh3, namekey, weighkey)
+        oneweighted(g, fp, degdir, analysis, weights,thresh3, namekey, weighkey, edges)
 
 def processmultigraph(g, fp, degdir, analysis, namekey='', mpkey=0, bipkey=0):
     """ Processes a multigraph or weighted graph by ignoring multiedges and
@@ -370,53 +670,32 @@ def processmultiplex(g, fp, degdir, analysis):
     # project onto layers
     # pull out list of attributes
     attributes = g.es.attributes()
+    edges = edgearrays(g)
     # if there are multiple edge types, split on these.
     if len(attributes)>1:
         for att in attributes:
             # assume that these attribute values are weights, so should be numeric
-            attkeyword = att+'_notin'
             # list of non-numeric values to avoid
             notthese = ['','Nan', 'n']
             # pull out edges that correspond to non empty weights
-            edgeseq = g.es(**{attkeyword:notthese})
-            # project onto the subgraph
-            graph = g.subgraph_edges(edgeseq)
+            mask = np.array([value not in notthese for value in g.es[att]],
+                            dtype=bool)
             namekey = '_multiplex'+att
             mpkey = 'sub_'+att
-            if sg.bipartite(graph, fp)==1:
-                processbipartite(graph, fp, degdir, analysis, namekey=namekey, mpkey=mpkey)
-            elif sg.multigraph(graph)==1 or sg.weighted(graph)==1:
-                processmultigraph(graph, fp, degdir, analysis, namekey=namekey, mpkey=mpkey)
-            elif sg.directed(graph)==1:
-                processdirected(graph, fp, degdir, analysis, namekey=namekey, mpkey=mpkey)
-            else:
-                readdeg(graph, fp,degdir,analysis, namekey=namekey, mpkey=mpkey)
+            processlayer(g, fp, degdir, analysis, edges, mask, namekey, mpkey)
     # If, however, there is one edge type, assume the split is in this, and
     # look at the values of this attribute
     else:
         att = attributes[0]
         # get just the unique values the attribute takes
-        types = np.unique(g.es[att])
-        # initilize empty list of edge seqs for each projection subgraph
-        edgeseqs = []
-        attkeyword = att+'_eq'
-        for typ in types:
-            edgeseqs.append((g.es(**{attkeyword:typ})))
-        # project onto the subgraphs
-        subgraphs = [g.subgraph_edges(edgeseq) for edgeseq in edgeseqs]
+        values = np.asarray(g.es[att])
+        types = np.unique(values)
         # process all the subgraphs
-        for i in range(len(subgraphs)):
-            graph = subgraphs[i]
+        for i in range(len(types)):
+            mask = values == types[i]
             namekey = '_multiplex'+str(types[i])
             mpkey = 'sub_'+str(i)
-            if sg.bipartite(graph, fp)==1:
-                processbipartite(graph, fp, degdir, analysis, namekey=namekey, mpkey=mpkey)
-            elif sg.multigraph(graph)==1 or sg.weighted(graph)==1:
-                processmultigraph(graph, fp, degdir, analysis, namekey=namekey, mpkey=mpkey)
-            elif sg.directed(graph)==1:
-                processdirected(graph, fp, degdir, analysis, namekey=namekey, mpkey=mpkey)
-            else:
-                readdeg(graph, fp,degdir,analysis, namekey=namekey, mpkey=mpkey)
+            processlayer(g, fp, degdir, analysis, edges, mask, namekey, mpkey)
 
         # process the union graph
         graph = g
@@ -434,38 +713,212 @@ def processmultiplex(g, fp, degdir, analysis):
             readdeg(graph, fp, degdir, analysis, namekey=namekey, mpkey=mpkey)
 
 
-def write_degree_sequences(gml_dir, deg_dir):
-    gml_df = buildGMLcatalog(gml_dir)
-    fpV = gml_df['fp_gml']
-    analysis_df = pd.DataFrame(columns=['num_edges', 'Weighted', 'Directed',
-                                         'Bipartite', 'Multigraph', 'Multiplex',
-                                         'fp_gml', 'n', 'alpha', 'xmin','ntail',
-                                         'Lpl', 'ppl', 'dexp', 'dln', 'dstrexp',
-                                         'dplwc', 'meandeg'])
+def processlayer(g, fp, degdir, analysis, edges, mask, namekey, mpkey):
+    """ Processes one layer of a multiplex graph, the subgraph made of the edges
+    in mask, sending it along the same path through the hierarchy as a copy of
+    it would take. Only a layer that has to be split into bipartite
+    projections is copied out of g; the degree sequences of the others are
+    counted from the edge arrays (see readmasked()).
+
+    Input:
+        g                     igraph Graph object, known to be multiplex
+        fp                    file path, leads to gml file
+        edges                 list, [source, target] from edgearrays(g)
+        mask                  ndarray, dtype = bool, edges of the layer
+        namekey               string, see readdeg()
+        mpkey                 string, see readdeg()
+
+    """
+    [source, target] = edges
+    n = g.vcount()
+    directed = g.is_directed()
+    if isbipartite(n, source[mask], target[mask]):
+        if 'type' in g.vs.attributes():
+            # project onto the subgraph
+            graph = g.subgraph_edges(np.nonzero(mask)[0].tolist())
+            if sg.bipartite(graph, fp)==1:
+                processbipartite(graph, fp, degdir, analysis, namekey=namekey, mpkey=mpkey)
+            elif sg.multigraph(graph)==1 or sg.weighted(graph)==1:
+                processmultigraph(graph, fp, degdir, analysis, namekey=namekey, mpkey=mpkey)
+            elif sg.directed(graph)==1:
+                processdirected(graph, fp, degdir, analysis, namekey=namekey, mpkey=mpkey)
+            else:
+                readdeg(graph, fp,degdir,analysis, namekey=namekey, mpkey=mpkey)
+            return
+        # as sg.bipartite() notes
+        sg.writeerror("%s is bipartite and has no attribute 'type'\n" %fp)
+    # as sg.multigraph() and sg.weighted() find for the layer
+    codes = edgecodes(n, source[mask], target[mask], directed)
+    multigraph = len(np.unique(codes)) < len(codes)
+    weighted = False
+    for att in ['weight', 'value']:
+        if att in g.es.attributes():
+            weighted = len(np.unique(np.asarray(g.es[att])[mask])) > 1
+            break
+    if multigraph or weighted:
+        # as processmultigraph()
+        mgkey = 0
+        weighkey = 0
+        if multigraph:
+            namekey += '_multigraphsimplified'
+            mgkey = 'simplified'
+        if weighted:
+            namekey += '_weightedsimplified'
+            weighkey = 'simplified'
+        readmasked(n, source, target, directed, fp, degdir, analysis, mask=mask,
+                   simplify=True, namekey=namekey, weighkey=weighkey,
+                   mgkey=mgkey, mpkey=mpkey)
+    else:
+        readmasked(n, source, target, directed, fp, degdir, analysis, mask=mask,
+                   namekey=namekey, mpkey=mpkey)
+
+def processgraph(g, fp, record, degdir, analysis):
+    """ Writes the degree sequences of a graph, taking the path that fits its
+    kind.
+
+    Input:
+        g                       igraph object, the graph
+        fp                      string, path to the gml file
+        record                  dict, its catalog entry, see classifygraph()
+        degdir                  string, path to directory of degree sequences
+        analysis                DataFrame, gets a row for each degree sequence
+    """
+    #### find what kind of graph this is (follow hierarchical ordering of types)
+    # check first for multiplex
+    if record['Multiplex'] == 1:
+        processmultiplex(g,fp, degdir, analysis)
+    elif record['Bipartite'] == 1:
+        processbipartite(g, fp, degdir,analysis)
+    elif record['Multigraph'] == 1:
+        processmultigraph(g, fp, degdir,analysis)
+    elif record['Weighted'] == 1:
+        processweighted(g, fp, degdir,analysis)
+    elif record['Directed'] == 1:
+        processdirected(g, fp, degdir,analysis)
+    else:
+        readdeg(g, fp,degdir,analysis)
+
+# columns of the table of degree sequences made by write_degree_sequences()
+DEGREECOLUMNS = ['num_edges', 'Weighted', 'Directed', 'Bipartite', 'Multigraph',
+                 'Multiplex', 'fp_gml', 'n', 'alpha', 'xmin','ntail', 'Lpl',
+                 'ks', 'ppl', 'dexp', 'dln', 'dstrexp', 'dplwc', 'meandeg']
+
+def gmlsequences(task):
+    """ Writes the degree sequences of one gml file for
+    write_degree_sequences(). This can run in a worker process, so the rows
+    for the table of degree sequences and the lines for the error files are
+    returned for the parent to merge and write rather than added here.
+
+    Input:
+        task                    list, [fp, deg_dir, record]. record is the
+                                file's catalog entry (see classifygraph()), or
+                                None to find it from the graph
+
+    Output:
+        fp                      string, path to the gml file
+        record                  dict, its catalog entry
+        rows                    list, [fn, row] for each degree sequence
+                                written, row being a dict of DEGREECOLUMNS
+        notes                   list, [errorfile, errormessage] pairs for
+                                sg.writeerror()
+    """
+    [fp, deg_dir, record] = task
+    g = igraph.read(fp)
+    [[record, rows], notes] = sg.holderrors(graphsequences, g, fp, deg_dir,
+                                            record)
+    return [fp, record, rows, notes]
+
+def graphsequences(g, fp, deg_dir, record):
+    """ The work of gmlsequences() on the graph read from the gml file.
+
+    Input:
+        g                       igraph object, the graph
+        fp                      string, path to the gml file
+        deg_dir                 string, path to directory of degree sequences
+        record                  dict, catalog entry, or None to find it
+
+    Output:
+        record                  dict, the catalog entry
+        rows                    list, see gmlsequences()
+    """
+    # the catalog entry, from the graph already read if not cached
+    if record is None:
+        record = classifygraph(g, fp)
+    if 'error' in record.values():
+        return [record, []]
+    analysis = pd.DataFrame(columns=DEGREECOLUMNS)
+    processgraph(g, fp, record, deg_dir, analysis)
+    rows = [[fn, dict(analysis.loc[fn])] for fn in analysis.index]
+    return [record, rows]
+
+def write_degree_sequences(gml_dir, deg_dir, catalogdb=None, workers=1):
+    """ Catalogs the gml files under gml_dir like buildGMLcatalog() and writes
+    the degree sequences of each network, reading each file once for both.
+    With workers > 1 the files are processed in a process pool, the largest
+    first, and their rows are put together here in the order the files were
+    found. With catalogdb, the catalog entries are cached as in
+    buildGMLcatalog(), so that files unchanged since are not checked again.
+
+    Input:
+        gml_dir                 string, path to the root directory where gmls are
+        deg_dir                 string, path to directory of degree sequences
+        catalogdb               string, filepath of the SQLite database of
+                                cataloged files (optional input)
+        workers                 int, number of files processed at once
+
+    Output:
+        analysis_df             DataFrame, a row for each degree sequence
+    """
+    fpV = findgmls(gml_dir)
+    if catalogdb is not None:
+        conn = opencatalog(catalogdb)
+    else:
+        conn = None
+    [records, fingerprints] = freshrecords(fpV, conn)
+    # largest first
+    tasks = [[fp, deg_dir, records.get(fp)] for fp in fpV]
+    tasks.sort(key=lambda task: -fingerprints[task[0]][0])
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(gmlsequences, tasks)
+    else:
+        pool = None
+        results = itertools.imap(gmlsequences, tasks)
+    rowsbyfp = {}
+    notesbyfp = {}
+    try:
+        for [fp, record, rows, notes] in results:
+            if conn is not None and fp not in records:
+                storecatalog(conn, fp, fingerprints[fp], record)
+            records[fp] = record
+            rowsbyfp[fp] = rows
+            notesbyfp[fp] = notes
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if conn is not None:
+            conn.close()
+    # a sequence written twice keeps its first place and its last row, and
+    # the error lines are written in the same order
+    merged = collections.OrderedDict()
     for fp in fpV:
-        g = igraph.read(fp)
-        #### find what kind of graph this is (follow hierarchical ordering of types)
-        # check first for multiplex
-        row = gml_df[gml_df.fp_gml==fp]
-        if row['Multiplex'].item() == 1:
-            processmultiplex(g,fp, deg_dir, analysis_df)
-        elif row['Bipartite'].item() == 1:
-            processbipartite(g, fp, deg_dir,analysis_df)
-        elif row['Multigraph'].item() == 1:
-            processmultigraph(g, fp, deg_dir,analysis_df)
-        elif row['Weighted'].item() == 1:
-            processweighted(g, fp, deg_dir,analysis_df)
-        elif row['Directed'].item() == 1:
-            processdirected(g, fp, deg_dir,analysis_df)
-        else:
-            readdeg(g, fp,deg_dir,analysis_df)
+        for [errorfile, errormessage] in notesbyfp[fp]:
+            sg.writeerror(errormessage, errorfile)
+        if 'error' in records[fp].values():
+            # this catches bad bipartite gmls
+            print('dropping {} from the considered gmls'.format(fp.split('/')[-1]))
+        for [fn, row] in rowsbyfp[fp]:
+            merged[fn] = row
+    analysis_df = pd.DataFrame(merged.values(), index=merged.keys(),
+                               columns=DEGREECOLUMNS, dtype=object)
     return analysis_df
 
 def organize_degree_sequences(deg_dir):
     fnV = [file for file in os.listdir(deg_dir) if file.split('.')[-1] in
                                                                 ['txt', 'csv']]
     analysis_df = pd.DataFrame(columns=['fp_gml', 'n', 'alpha', 'xmin','ntail',
-                                        'Lpl', 'ppl', 'dexp', 'dln', 'dstrexp',
+                                        'Lpl', 'ks', 'ppl', 'dexp', 'dln', 'dstrexp',
                                          'dplwc', 'meandeg'], index = fnV)
 
     for fn in fnV:
@@ -497,58 +950,705 @@ def writeerror_lrt(errormessage):
     f.close()
 
 
-def analyze_degree_sequences(deg_dir, analysis):
+def sequencecost(counts):
+    """ Rough relative cost of analyzing a degree sequence, used to schedule the
+    expensive sequences first. Each of the resamples in fit.plpval() draws n
+    values and fits them, scanning every candidate xmin against the distinct
+    values, so the cost grows like n plus the square of the number of
+    distinct values.
+
+    Input:
+        counts                  ndarray, number of times each xval occurs
+
+    Output:
+        cost                    float, estimated cost in arbitrary units
+    """
+    n = np.sum(counts)
+    nunique = len(counts)
+    cost = float(n) + float(nunique)**2
+    return cost
+
+def sequencehash(xvalues, counts):
+    """ Content hash of a degree sequence's count table, the same for any two
+    files that hold the same sequence whatever their row order.
+
+    Input:
+        xvalues                 ndarray, distinct xvals
+        counts                  ndarray, number of times each xval occurs
+
+    Output:
+        seqhash                 string, hex digest
+    """
+    xvalues = np.asarray(xvalues, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    keep = counts > 0
+    order = np.argsort(xvalues[keep], kind='mergesort')
+    table = np.vstack([xvalues[keep][order], counts[keep][order]])
+    seqhash = hashlib.sha1(np.ascontiguousarray(table).tobytes()).hexdigest()
+    return seqhash
+
+def duplicatesequences(deg_dir, fnV, archivefp=None):
+    """ Finds the degree sequences among fnV that are identical to an earlier
+    one, and reports how much of the estimated cost of analyzing them all
+    (see sequencecost()) they account for, i.e. what deduplication saves.
+
+    Input:
+        deg_dir                 string, path to directory of degree sequences
+        fnV                     list, file names of the degree sequences
+        archivefp               string, archive of deg_dir made by im.packdata()
+                                to read from instead of the text files
+                                (optional input)
+
+    Output:
+        dups                    DataFrame, indexed by fnV, with columns 'hash',
+                                'cost' and 'first', the name of the first
+                                sequence in fnV identical to it (itself if none)
+    """
+    if archivefp is not None:
+        corpus = im.opencorpus(archivefp)
+    dups = pd.DataFrame(columns=['hash', 'cost', 'first'], index=fnV)
+    first = {}
+    for fn in fnV:
+        if archivefp is None:
+            [xvalues, counts] = im.readcounts(deg_dir + fn)
+        else:
+            [xvalues, counts] = im.readpacked(corpus, fn, expand=False)
+        seqhash = sequencehash(xvalues, counts)
+        first.setdefault(seqhash, fn)
+        dups.loc[fn, 'hash'] = seqhash
+        dups.loc[fn, 'cost'] = sequencecost(counts)
+        dups.loc[fn, 'first'] = first[seqhash]
+    isdup = dups['first'] != dups.index
+    saved = dups['cost'][isdup].sum()/float(dups['cost'].sum())
+    print '%d sequences, %d distinct, %d duplicates: %.1f%% of the estimated cost saved' \
+        %(len(dups), len(first), isdup.sum(), 100*saved)
+    return dups
+
+# corpora opened by this process, see sharedcorpus()
+CORPORA = {}
+
+def sharedcorpus(archivefp):
+    """ Opens the archive at archivefp with im.opencorpus() the first time it is
+    asked for in this process, and returns the same corpus after that. Pool
+    workers forked after the parent opened it inherit it, and others open it
+    once each.
+
+    Input:
+        archivefp               string, archive made by im.packdata()
+
+    Output:
+        corpus                  dict, as returned by im.opencorpus()
+    """
+    if archivefp not in CORPORA:
+        CORPORA[archivefp] = im.opencorpus(archivefp)
+    return CORPORA[archivefp]
+
+def analyzesequence(task, pool=None):
+    """ Analyzes one degree sequence for analyze_degree_sequences(): fits the
+    power law and finds its p-value and/or runs the likelihood ratio tests.
+    This can run in a worker process, so results and error messages are
+    returned for the parent to record rather than written here.
+
+    Input:
+        task                    list, [fn, fp, archivefp, dopl, dolrt, alpha,
+                                xmin, ks, lrtworkers, lrtexecutor, pvalue,
+                                seed]. The sequence is read from fp, or by name
+                                fn from the archive at archivefp (see
+                                im.packdata()) if that is not None. alpha, xmin
+                                and ks are the stored fit, used instead of
+                                fitting again unless ks is None. pvalue is
+                                how dopl finds the p-value, see
+                                analyze_degree_sequences(), and seed the seed
+                                of its bootstrap (see fit.plpval())
+        pool                    pool from lrt.fitpool() to run the alternative
+                                fits in, instead of making one per sequence
+
+    Output:
+        fn                      string, name of the degree sequence
+        record                  dict, new values for the row of the analysis
+                                DataFrame
+        errors                  list, [kind, errormessage] pairs, kind being
+                                'analysis' or 'lrt'
+        timings                 dict, seconds spent in the power-law fit and
+                                p-value ('time_pl') and in the likelihood ratio
+                                tests ('time_lrt')
+        fits                    dict, see fitsequence()
+    """
+    [fn, fp, archivefp, dopl, dolrt, alpha, xmin, ks, lrtworkers,
+     lrtexecutor, pvalue, seed] = task
+    x = readsequence(fn, fp, archivefp)
+    record = {}
+    errors = checksequence(x, fp)
+    timings = {}
+    fits = {}
+    if len(errors) == 0:
+        if dopl and ks is None:
+            t0 = time.time()
+            [record, errors, fits] = fitsequence(x, fp)
+            [alpha, xmin, ks] = [record['alpha'], record['xmin'], record['ks']]
+            timings['time_pl'] = time.time()-t0
+        if dopl and pvalue is not None:
+            # from the fit above or the stored one, which the likelihood ratio
+            # tests were run at
+            t0 = time.time()
+            p = fit.plpval(x,alpha, xmin, ks, seed=seed,
+                           sequential=(pvalue == 'sequential'))
+            record['ppl'] = p
+            timings['time_pl'] = timings.get('time_pl', 0.) + time.time()-t0
+        if dolrt:
+            t0 = time.time()
+            # compare the alternative distributions
+            x = x[x>=xmin]
+            # fits shared by the nested and non-nested tests
+            memo = {}
+            # compare the non-nested and nested alternatives, return the
+            # decisions for each. With lrtworkers > 1 the fits run at once
+            decisionthresh = 0.1
+            [[dexp, dln, dstrexp], dplwc] = lrt.alternatives(x, alpha,
+                decisionthresh, memo, workers=lrtworkers,
+                executor=lrtexecutor, pool=pool)
+            if dexp == 2:
+                errors.append(['lrt', "Exponential didn't converge for %s \n" %fp])
+            if dln == 2:
+                errors.append(['lrt', "Log-normal didn't converge for %s \n" %fp])
+            if dstrexp == 2:
+                errors.append(['lrt', "Stretched exponential didn't converge for %s \n" %fp])
+            if dplwc == 2:
+                errors.append(['lrt', "PLWC didn't converge for %s \n" %fp])
+            record['dexp'] = dexp
+            record['dln'] = dln
+            record['dstrexp'] = dstrexp
+            record['dplwc'] = dplwc
+            timings['time_lrt'] = time.time()-t0
+    return [fn, record, errors, timings, fits]
+
+def readsequence(fn, fp, archivefp):
+    """ Reads a degree sequence for analyzesequence() and fitseries(), from
+    its text file or from the archive (see sharedcorpus()).
+
+    Input:
+        fn                      string, name of the degree sequence
+        fp                      string, filepath of the degree sequence
+        archivefp               string, archive made by im.packdata(), or None
+
+    Output:
+        x                       ndarray, the degree sequence
+    """
+    if archivefp is None:
+        x = im.readdata(fp)
+    else:
+        x = im.readpacked(sharedcorpus(archivefp), fn)
+    return x
+
+def checksequence(x, fp):
+    """ Checks that a degree sequence can be analyzed.
+
+    Input:
+        x                       ndarray, the degree sequence
+        fp                      string, filepath of the degree sequence
+
+    Output:
+        errors                  list, [kind, errormessage] pairs, empty if the
+                                sequence can be analyzed
+    """
+    errors = []
+    # note if there is a problem with the file
+    n = len(x)
+    if np.mean(x) < 2 or np.mean(x) > np.sqrt(n):
+        errors.append(['analysis', "%s has a bad mean degree \n" %fp])
+    # catch for trivial degree sequences
+    elif len(np.unique(x)) == 1:
+        errors.append(['analysis', "%s contains only one unique value \n" %fp])
+    return errors
+
+def fitsequence(x, fp, warm=None):
+    """ Fits the power law to a degree sequence, with fit.pl(), or with
+    fit.plnear() if warm gives the xmin of the previous snapshot.
+
+    Input:
+        x                       ndarray, the degree sequence
+        fp                      string, filepath of the degree sequence
+        warm                    dict, fits to the previous snapshot (see
+                                fitseries()): 'xmin', 'window' and 'verify'
+                                for fit.plnear() (optional input)
+
+    Output:
+        record                  dict, 'n', 'alpha', 'xmin', 'ntail', 'Lpl'
+                                and 'ks' for the row of the analysis DataFrame
+        errors                  list, [kind, errormessage] pairs
+        fits                    dict, 'narrowed', 'verified' and 'agreed' if
+                                warm gave an xmin
+    """
+    errors = []
+    fits = {}
+    if warm is not None and 'xmin' in warm:
+        # search for xmin near the previous snapshot's
+        [alpha, xmin, ntail, L, ks, narrowed] = fit.plnear(x,
+            warm['xmin'], warm['window'])
+        fits['narrowed'] = narrowed
+        fits['verified'] = narrowed and warm['verify']
+        if fits['verified']:
+            # check the shortcut against the full search
+            fullfit = fit.pl(x)
+            fits['agreed'] = fullfit[1] == xmin and \
+                             np.isclose(fullfit[0], alpha)
+            if not fits['agreed']:
+                errors.append(['analysis', "narrowed xmin search disagrees with the full fit for %s \n" %fp])
+                [alpha, xmin, ntail,  L, ks] = fullfit
+    else:
+        [alpha, xmin, ntail,  L, ks] = fit.pl(x)
+    record = {'n': len(x), 'alpha': alpha, 'xmin': xmin, 'ntail': ntail,
+              'Lpl': L, 'ks': ks}
+    return [record, errors, fits]
+
+def snapshotseries(fnV):
+    """ Groups degree sequences that are snapshots of one network on different
+    dates, such as those of the Route Views and CAIDA AS graphs, by their names
+    with the date (eight digits, yyyymmdd) taken out, along with any span of
+    years the collection was split by (e.g. the 1997-1998 and 1999-2000 parts
+    of the Route Views graphs) and the number of digits in the number of nodes
+    (e.g. _n3 or _n4), which changes as the network grows. Each group is put
+    in date order. Sequences without a date in their name are groups of one.
+
+    Input:
+        fnV                     list, file names of the degree sequences
+
+    Output:
+        seriesV                 list, one list of file names per group, in date
+                                order
+    """
+    groups = collections.OrderedDict()
+    for fn in fnV:
+        match = re.search(r'(19|20)\d{6}', fn)
+        if match is None:
+            groups.setdefault(fn, []).append(['', fn])
+        else:
+            key = fn[:match.start()] + '*' + fn[match.end():]
+            key = re.sub(r'(19|20)\d{2}-(19|20)\d{2}', '*', key)
+            key = re.sub(r'_n\d+\.gml', '_n*.gml', key)
+            groups.setdefault(key, []).append([match.group(), fn])
+    seriesV = [[fn for [date, fn] in sorted(group)]
+               for group in groups.values()]
+    return seriesV
+
+def fitseries(series):
+    """ Fits the power law to the snapshots of one network (see
+    snapshotseries()) one after the other for analyze_degree_sequences(),
+    each starting from the fit to the one before: the xmin search is narrowed
+    to a window around the previous xmin (see fit.plnear()). Every verify-th
+    snapshot is also fitted with fit.pl() if the narrowed fit was kept, and
+    the full fit is used if they disagree.
+    Only these fits are chained, as they are cheap next to the p-values and
+    the likelihood ratio tests, which then run for each snapshot on its own
+    at the fits found here (see analyzesequence()). The alternative
+    distributions are fitted from their usual starting points, as a start
+    from the previous snapshot's fit can converge to a different optimum and
+    change the decisions.
+
+    Input:
+        series                  list, [tasks, window, verify]. tasks is a list
+                                of tasks for analyzesequence(), in date order.
+                                window is the factor for fit.plnear(). verify
+                                is an int, 0 for no checks
+
+    Output:
+        results                 list, [fn, record, errors, timings, fits] for
+                                each task as analyzesequence() returns them,
+                                with only the power-law fit in record. fits
+                                also has the 'alpha', 'xmin' and 'ks' to go
+                                on from, unless the sequence could not be
+                                analyzed
+    """
+    [tasks, window, verify] = series
+    results = []
+    warm = None
+    nwarm = 0
+    for task in tasks:
+        [fn, fp, archivefp, dopl, dolrt, alpha, xmin, ks] = task[:8]
+        x = readsequence(fn, fp, archivefp)
+        record = {}
+        errors = checksequence(x, fp)
+        timings = {}
+        fits = {}
+        if len(errors) == 0:
+            if dopl and ks is None:
+                if warm is not None:
+                    nwarm += 1
+                    warm['verify'] = verify > 0 and nwarm % verify == 0
+                t0 = time.time()
+                [record, errors, fits] = fitsequence(x, fp, warm)
+                [alpha, xmin, ks] = [record['alpha'], record['xmin'],
+                                     record['ks']]
+                timings['time_pl'] = time.time()-t0
+            fits['alpha'] = alpha
+            fits['xmin'] = xmin
+            fits['ks'] = ks
+            # sequences that could not be fitted leave the previous fits in
+            # place
+            warm = dict(fits)
+            warm['window'] = window
+        results.append([fn, record, errors, timings, fits])
+    return results
+
+def joinresults(first, second):
+    """ Joins two results of analyzesequence() for the same degree sequence,
+    such as the fit from fitseries() and the p-value and likelihood ratio
+    tests made from it.
+
+    Input:
+        first                   list, [fn, record, errors, timings, fits]
+        second                  list, [fn, record, errors, timings, fits]
+
+    Output:
+        result                  list, [fn, record, errors, timings, fits] with
+                                the records and timings of both, the errors of
+                                first then second, and the fits of first
+    """
+    [fn, record, errors, timings, fits] = first
+    record = dict(record)
+    record.update(second[1])
+    timings = dict(timings)
+    for key in second[3]:
+        timings[key] = timings.get(key, 0.) + second[3][key]
+    return [fn, record, errors + second[2], timings, fits]
+
+def analyze_degree_sequences(deg_dir, analysis, lrtworkers=1, lrtexecutor=None,
+                             workers=1, archivefp=None, resultsdb=None,
+                             overwrite=False, dedup=True, series=False,
+                             serieswindow=8., seriesverify=10, pvalue='full'):
+    """ Fits the power law, finds its p-value and runs the likelihood ratio
+    tests for every degree sequence in analysis that does not have them yet.
+    With workers > 1 the sequences are farmed out to a process pool, the most
+    expensive first (see sequencecost()) so that the pool does not wait on a
+    long sequence started last, and the results are merged into analysis here.
+    The fits for the likelihood ratio tests of one sequence can also run at
+    once (lrtworkers, see lrt.alternatives()); inside a process pool only
+    threads can do this.
+
+    With resultsdb, each sequence's results are committed to an SQLite
+    database (see openresults()) as soon as it finishes, and sequences already
+    in it are filled in from it and skipped, so an interrupted run can be
+    restarted where it stopped. overwrite redoes every sequence regardless of
+    stored or existing results.
+
+    With dedup, sequences with identical count tables (see sequencehash()),
+    such as a multiplex union equal to one of its layers, are analyzed once and
+    share the results, which are also taken from any identical sequence in
+    resultsdb. The estimated cost this saves is printed at the end.
+
+    With series, the snapshots of one network on different dates (see
+    snapshotseries()) are fitted in date order by one worker, each fit
+    starting from the one before (see fitseries()), and then their p-values
+    and likelihood ratio tests are farmed out one snapshot at a time like any
+    other sequence. Every seriesverify-th of these fits is checked against the
+    full fit; the number checked and the number that disagreed are printed at
+    the end and disagreements are written to the analysis error file.
+
+    pvalue='sequential' stops each bootstrap as soon as the p-value is known to
+    be on one side of 0.1 (see fit.plpval()), which is all categorize_networks()
+    uses. pvalue=None fits the power law without its p-value, which is left
+    missing for a later run (see categorize_networks_lazy()).
+
+    Input:
+        deg_dir                 string, path to directory of degree sequences
+        analysis                DataFrame, table of results indexed by degree seq
+        lrtworkers              int, number of alternative fits run at once
+        lrtexecutor             string, 'thread' or 'process', see lrt.fitpool().
+                                Default is 'process', or 'thread' with
+                                workers > 1
+        workers                 int, number of sequences analyzed at once
+        archivefp               string, archive of deg_dir made by im.packdata()
+                                to read the sequences from instead of their text
+                                files (optional input)
+        resultsdb               string, filepath of the SQLite database of
+                                finished sequences (optional input)
+        overwrite               Boolean, if True analyze every sequence again
+        dedup                   Boolean, if True analyze identical sequences once
+        series                  Boolean, if True fit snapshot series with
+                                warm starts
+        serieswindow            float, factor by which the xmin of a snapshot is
+                                searched for around the previous one (see
+                                fit.plnear())
+        seriesverify            int, check every seriesverify-th warm-started
+                                snapshot against the full fit, 0 for never
+        pvalue                  string, 'full' or 'sequential', or None for no
+                                p-value
+
+    Output:
+        analysis                DataFrame, updated with the results
+    """
+    if lrtexecutor is None:
+        lrtexecutor = 'process' if workers == 1 else 'thread'
+    if workers > 1 and lrtworkers > 1 and lrtexecutor != 'thread':
+        raise ValueError("with workers > 1, lrtexecutor must be 'thread'")
+    if archivefp is not None:
+        # opened before the pool is made, so that its workers inherit it
+        corpus = sharedcorpus(archivefp)
+    # tables made before the KS distance of the fit was kept
+    if 'ks' not in analysis.columns:
+        analysis['ks'] = np.nan
+    # fill in the sequences finished by an earlier run
+    done = set()
+    storedbyhash = {}
+    if resultsdb is not None:
+        conn = openresults(resultsdb)
+        if not overwrite:
+            stored = loadresults(conn)
+            # complete results, for identical sequences
+            if dedup:
+                for fn in stored:
+                    if stored[fn]['hash'] is not None and \
+                       stored[fn]['ppl'] is not None and \
+                       stored[fn]['dexp'] is not None:
+                        storedbyhash[stored[fn]['hash']] = stored[fn]
+            for fn in analysis.index:
+                if fn in stored:
+                    for col in RESULTCOLUMNS:
+                        if stored[fn][col] is not None:
+                            analysis.loc[fn, col] = stored[fn][col]
+                    # stored without a p-value by a pvalue=None run, or could
+                    # not be analyzed at all
+                    if (stored[fn]['ppl'] is not None or pvalue is None or
+                        stored[fn]['alpha'] is None):
+                        done.add(fn)
+    # find what each sequence still needs, and how long it will take
+    tasks = []
+    costV = []
+    # identical sequences waiting on each task, and the cost this saves
+    dups = {}
+    first = {}
+    hashes = {}
+    nreused = 0
+    totalcost = 0.
+    savedcost = 0.
     for fn in analysis.index:
+        # drawn here, in the order of analysis, so that the p-values do not
+        # depend on which worker runs which sequence
+        seed = np.random.randint(2**31)
+        if fn in done:
+            continue
         fp = deg_dir + fn
-        x = im.readdata(fp)
-        # note if there is a problem with the file
-        n = len(x)
-        if np.mean(x) < 2 or np.mean(x) > np.sqrt(n):
-            errormessage = "%s has a bad mean degree \n" %fp
-            writeerror_analysis(errormessage)
-        # catch for trivial degree sequences
-        elif len(np.unique(x)) == 1:
-            errormessage = "%s contains only one unique value \n" %fp
-            writeerror_analysis(errormessage)
+        if pvalue is None:
+            dopl = missingresult(analysis.loc[fn, 'alpha']) or overwrite
+        else:
+            dopl = missingresult(analysis.loc[fn, 'ppl']) or overwrite
+        dolrt = missingresult(analysis.loc[fn, 'dexp']) or overwrite
+        # the stored fit, or None to fit again
+        if overwrite or missingresult(analysis.loc[fn, 'alpha']) or \
+           missingresult(analysis.loc[fn, 'ks']):
+            ks = None
+        else:
+            ks = analysis.loc[fn, 'ks']
+        if dopl or dolrt:
+            if archivefp is None:
+                [xvalues, counts] = im.readcounts(fp)
+            else:
+                [xvalues, counts] = im.readpacked(corpus, fn, expand=False)
+            cost = sequencecost(counts)
+            totalcost += cost
+            if dedup:
+                seqhash = sequencehash(xvalues, counts)
+                hashes[fn] = seqhash
+                # the same sequence with the same work to do
+                key = (seqhash, dopl, dolrt)
+                if not dopl or ks is not None:
+                    key += (analysis.loc[fn, 'alpha'], analysis.loc[fn, 'xmin'],
+                            ks)
+                if key in first:
+                    dups[first[key]].append(fn)
+                    nreused += 1
+                    savedcost += cost
+                    continue
+                if dopl and dolrt and seqhash in storedbyhash:
+                    for col in RESULTCOLUMNS:
+                        if storedbyhash[seqhash][col] is not None:
+                            analysis.loc[fn, col] = storedbyhash[seqhash][col]
+                    storeresult(conn, fn, analysis.loc[fn], [], {}, seqhash)
+                    nreused += 1
+                    savedcost += cost
+                    continue
+                first[key] = fn
+            dups[fn] = []
+            tasks.append([fn, fp, archivefp, dopl, dolrt,
+                          analysis.loc[fn, 'alpha'], analysis.loc[fn, 'xmin'],
+                          ks, lrtworkers, lrtexecutor, pvalue, seed])
+            costV.append(cost)
+    # most expensive first
+    costbyfn = dict((task[0], cost) for task, cost in zip(tasks, costV))
+    items = sorted(tasks, key=lambda task: -costbyfn[task[0]])
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        mapper = pool.imap_unordered
+        analyze = analyzesequence
+    else:
+        # one pool runs the alternative fits of every degree sequence
+        if lrtworkers > 1:
+            pool = lrt.fitpool(lrtworkers, lrtexecutor)
+        else:
+            pool = None
+        mapper = itertools.imap
+        analyze = functools.partial(analyzesequence, pool=pool)
+    nnarrowed = 0
+    nverified = 0
+    ndisagreed = 0
+    try:
+        if series:
+            # the snapshots of one network are fitted by one worker, in date
+            # order; their p-values and tests are then found at these fits
+            taskbyfn = dict((task[0], task) for task in tasks)
+            seriesV = [[[taskbyfn[fn] for fn in group], serieswindow,
+                        seriesverify]
+                       for group in snapshotseries([task[0] for task in tasks])]
+            seriesV.sort(key=lambda series: -sum([costbyfn[task[0]]
+                                                  for task in series[0]]))
+            fitted = {}
+            finished = []
+            items = []
+            for result in itertools.chain.from_iterable(mapper(fitseries,
+                                                               seriesV)):
+                [fn, record, errors, timings, fits] = result
+                task = list(taskbyfn[fn])
+                [dopl, dolrt] = task[3:5]
+                if 'xmin' in fits and (dolrt or (dopl and pvalue is not None)):
+                    task[5:8] = [fits['alpha'], fits['xmin'], fits['ks']]
+                    items.append(task)
+                    fitted[fn] = result
+                else:
+                    finished.append(result)
+            items.sort(key=lambda task: -costbyfn[task[0]])
+            results = itertools.chain(finished, itertools.imap(
+                lambda result: joinresults(fitted[result[0]], result),
+                mapper(analyze, items)))
         else:
-            if analysis.loc[fn]['ppl']=='' or overwrite == True:
-                analysis.loc[fn]['n'] = n
-                [alpha, xmin, ntail,  L, ks] = fit.pl(x)
-                p = fit.plpval(x,alpha, xmin, ks)
-                analysis.loc[fn]['alpha'] = alpha
-                analysis.loc[fn]['xmin'] = xmin
-                analysis.loc[fn]['ntail'] = ntail
-                analysis.loc[fn]['Lpl'] = L
-                analysis.loc[fn]['ppl'] = p
-            if analysis.loc[fn]['dexp']=='' or overwrite == True:
-                # compare the alternative distributions
-                xmin = analysis.loc[fn]['xmin']
-                alpha = analysis.loc[fn]['alpha']
-                x = x[x>=xmin]
-                # compare the non-nested alternatives, return the decisions for each
-                decisionthresh = 0.1
-                [dexp, dln, dstrexp] = lrt.nonnested(x,alpha, decisionthresh)
-                if dexp == 2:
-                    errormessage = "Exponential didn't converge for %s \n" %fp
-                    writeerror_lrt(errormessage)
-                if dln == 2:
-                    errormessage = "Log-normal didn't converge for %s \n" %fp
-                    writeerror_lrt(errormessage)
-                if dstrexp == 2:
-                    errormessage = "Stretched exponential didn't converge for %s \n" %fp
-                    writeerror_lrt(errormessage)
-                # fit the nested alternatives
-                dplwc = lrt.nested(x, alpha, decisionthresh)
-                if dplwc == 2:
-                    errormessage = "PLWC didn't converge for %s \n" %fp
-                    writeerror_lrt(errormessage)
+            results = mapper(analyze, items)
+        for [fn0, record, errors0, timings, fits] in results:
+            nnarrowed += fits.get('narrowed', False)
+            nverified += fits.get('verified', False)
+            ndisagreed += fits.get('verified', False) and not fits['agreed']
+            # the sequence itself and any identical ones
+            for fn in [fn0] + dups[fn0]:
+                errors = [[kind, errormessage.replace(deg_dir + fn0, deg_dir + fn)]
+                          for [kind, errormessage] in errors0]
+                for [kind, errormessage] in errors:
+                    if kind == 'analysis':
+                        writeerror_analysis(errormessage)
+                    else:
+                        writeerror_lrt(errormessage)
                 # update dataframe
-                analysis.loc[fn]['dexp'] = dexp
-                analysis.loc[fn]['dln'] = dln
-                analysis.loc[fn]['dstrexp'] = dstrexp
-                analysis.loc[fn]['dplwc'] = dplwc
+                for col in record:
+                    analysis.loc[fn, col] = record[col]
+                if resultsdb is not None:
+                    if fn != fn0:
+                        timings = {}
+                    storeresult(conn, fn, analysis.loc[fn], errors, timings,
+                                hashes.get(fn))
+        if dedup and totalcost > 0:
+            print '%d sequences analyzed, %d reused from identical ones: %.1f%% of the estimated cost saved' \
+                %(len(tasks), nreused, 100*savedcost/totalcost)
+        if series:
+            print '%d snapshots fitted near the previous xmin, %d checked against the full fit, %d disagreed' \
+                %(nnarrowed, nverified, ndisagreed)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if resultsdb is not None:
+            conn.close()
     return analysis
 
+def missingresult(value):
+    """ True if an entry of the analysis DataFrame has not been filled in yet,
+    i.e. is '' (as in the rows made by readdeg()) or NaN (as in those made by
+    organize_degree_sequences()).
+    """
+    return (isinstance(value, basestring) and value == '') or \
+        (not isinstance(value, basestring) and pd.isnull(value))
+
+""" Functions for the database of finished sequences used by
+analyze_degree_sequences() """
+# analysis columns kept in the database, with their SQLite types
+RESULTCOLUMNS = collections.OrderedDict([('n', 'INTEGER'), ('alpha', 'REAL'),
+    ('xmin', 'INTEGER'), ('ntail', 'INTEGER'), ('Lpl', 'REAL'), ('ks', 'REAL'),
+    ('ppl', 'REAL'), ('dexp', 'INTEGER'), ('dln', 'INTEGER'),
+    ('dstrexp', 'INTEGER'), ('dplwc', 'INTEGER')])
+
+def openresults(dbfp):
+    """ Opens (and if needed creates) the SQLite database of finished degree
+    sequences. It has one row per sequence, with the analysis columns in
+    RESULTCOLUMNS, the error messages, the time spent, when it finished and
+    the hash of its count table (see sequencehash()).
+
+    Input:
+        dbfp                    string, filepath of the database
+
+    Output:
+        conn                    sqlite3.Connection
+    """
+    conn = sqlite3.connect(dbfp)
+    cols = ', '.join(['%s %s' %(col, RESULTCOLUMNS[col]) for col in RESULTCOLUMNS])
+    conn.execute('CREATE TABLE IF NOT EXISTS results (fn TEXT PRIMARY KEY, %s, '
+                 'errors TEXT, time_pl REAL, time_lrt REAL, finished REAL, '
+                 'hash TEXT)' %cols)
+    # databases made before hashes or the KS distance were stored
+    found = [line[1] for line in conn.execute('PRAGMA table_info(results)')]
+    if 'hash' not in found:
+        conn.execute('ALTER TABLE results ADD COLUMN hash TEXT')
+    for col in RESULTCOLUMNS:
+        if col not in found:
+            conn.execute('ALTER TABLE results ADD COLUMN %s %s'
+                         %(col, RESULTCOLUMNS[col]))
+    conn.commit()
+    return conn
+
+def storeresult(conn, fn, row, errors, timings, seqhash=None):
+    """ Commits the results of one degree sequence to the database, replacing
+    any earlier ones.
+
+    Input:
+        conn                    sqlite3.Connection, from openresults()
+        fn                      string, name of the degree sequence
+        row                     Series, its row of the analysis DataFrame
+        errors                  list, [kind, errormessage] pairs
+        timings                 dict, 'time_pl' and/or 'time_lrt' in seconds
+        seqhash                 string, hash of its count table (optional input)
+    """
+    values = [fn]
+    for col in RESULTCOLUMNS:
+        value = row[col] if col in row.index else None
+        if value is None or missingresult(value):
+            values.append(None)
+        elif RESULTCOLUMNS[col] == 'INTEGER':
+            values.append(int(value))
+        else:
+            values.append(float(value))
+    values.append(''.join([errormessage for [kind, errormessage] in errors]))
+    values.append(timings.get('time_pl'))
+    values.append(timings.get('time_lrt'))
+    values.append(time.time())
+    values.append(seqhash)
+    cols = ['fn'] + list(RESULTCOLUMNS) + ['errors', 'time_pl', 'time_lrt',
+                                           'finished', 'hash']
+    conn.execute('INSERT OR REPLACE INTO results (%s) VALUES (%s)'
+                 %(', '.join(cols), ', '.join(['?']*len(values))), values)
+    conn.commit()
+
+def loadresults(conn):
+    """ Reads every finished degree sequence from the database.
+
+    Input:
+        conn                    sqlite3.Connection, from openresults()
+
+    Output:
+        stored                  dict, name of degree sequence -> dict of its
+                                RESULTCOLUMNS and 'hash' (None where not found)
+    """
+    stored = {}
+    cols = list(RESULTCOLUMNS) + ['hash']
+    cursor = conn.execute('SELECT fn, %s FROM results' %', '.join(cols))
+    for line in cursor:
+        stored[line[0]] = dict(zip(cols, line[1:]))
+    return stored
+
 """ Helper functions for categorizing networks into scale-free types"""
 def test_strong(rows):
     S1 = False # strongest
@@ -664,3 +1764,120 @@ def categorize_networks(df, permissive=False):
         hyps.loc[dataset]['n'] = np.max(rows.n)
         hyps.loc[dataset]['median_ntail'] = np.median(rows.ntail)
     return hyps
+
+
+def categorize_rows(rows, permissive=False):
+    """ The category tests of categorize_networks() for the degree sequences of
+    one dataset.
+
+    Input:
+        rows                    DataFrame, the dataset's rows of the analysis
+        permissive              Boolean, if True also run the tests that need
+                                only one sequence
+
+    Output:
+        outcome                 tuple, (Strongest, Strong, Weak, Weakest,
+                                Super_Weak) and, if permissive, (Strong_Any,
+                                Weak_Any, Weakest_Any, Super_Weak_Any)
+    """
+    outcome = test_strong(rows) + test_weak(rows)
+    if permissive:
+        outcome += (test_strong_any(rows),) + test_weak_any(rows)
+    return outcome
+
+def pvaluesneeded(rows, unknown, permissive=False):
+    """ Counts how many of the missing p-values of a dataset, computed in the
+    order given, it takes at least to settle its category. The tests only ask
+    whether p > 0.1 and only ever pass more easily when it is, so the category
+    is settled once it comes out the same with every missing p-value above 0.1
+    as with all of them below. Taking the next k p-values in order settles it
+    at best when they all fall on the same side; on each side this gets more
+    likely with k, so the smallest such k is found by bisection.
+
+    Input:
+        rows                    DataFrame, the dataset's rows of the analysis
+        unknown                 list, names of the sequences with a missing
+                                p-value, in the order they would be computed
+        permissive              Boolean, see categorize_rows()
+
+    Output:
+        k                       int, 0 if the category is already settled
+    """
+    def settled(k, value):
+        # the first k missing p-values are value, the rest either way
+        filled = rows.copy()
+        filled.loc[unknown[:k], 'ppl'] = value
+        filled.loc[unknown[k:], 'ppl'] = 0.
+        low = categorize_rows(filled, permissive)
+        filled.loc[unknown[k:], 'ppl'] = 1.
+        high = categorize_rows(filled, permissive)
+        return low == high
+    k = len(unknown)
+    for value in [0., 1.]:
+        [left, right] = [0, k]
+        while left < right:
+            mid = (left+right)//2
+            if settled(mid, value):
+                right = mid
+            else:
+                left = mid+1
+        k = min(k, left)
+    return k
+
+def categorize_networks_lazy(deg_dir, analysis, permissive=False, **kwargs):
+    """ Analyzes the degree sequences and categorizes the networks like
+    analyze_degree_sequences() followed by categorize_networks(), but computes
+    only the p-values the categories depend on. The power-law fits and the
+    likelihood ratio tests, which are cheap next to the p-value's bootstrap,
+    are run for every sequence first. Then, in rounds, each dataset whose
+    category is not settled yet gets the next p-values it needs (the fewest
+    that could settle it, see pvaluesneeded()), shortest sequences first, and
+    each bootstrap stops as soon as p is known to be on one side of 0.1
+    (pvalue='sequential'). A dataset's remaining p-values are skipped once its
+    other sequences decide its category; they stay missing in analysis, so a
+    later analyze_degree_sequences() run can still fill them in.
+
+    Input:
+        deg_dir                 string, path to directory of degree sequences
+        analysis                DataFrame, table of results indexed by degree seq
+        permissive              Boolean, see categorize_networks()
+        any other keyword arguments are passed on to analyze_degree_sequences()
+
+    Output:
+        analysis                DataFrame, updated with the results
+        hyps                    DataFrame, as returned by categorize_networks()
+    """
+    # the fits and likelihood ratio tests of every sequence
+    analysis = analyze_degree_sequences(deg_dir, analysis, pvalue=None, **kwargs)
+    # the p-values below are found at these fits, not at new ones
+    kwargs['overwrite'] = False
+    npvalues = 0
+    while True:
+        batch = []
+        nunknown = 0
+        for dataset in np.unique(analysis.fp_gml):
+            rows = analysis[analysis.fp_gml == dataset]
+            # sequences that could not be fitted fail the tests either way
+            unknown = [fn for fn in rows.index
+                       if missingresult(rows.loc[fn, 'ppl']) and
+                       not missingresult(rows.loc[fn, 'alpha'])]
+            unknown.sort(key=lambda fn: rows.loc[fn, 'n'])
+            nunknown += len(unknown)
+            batch += unknown[:pvaluesneeded(rows, unknown, permissive)]
+        if len(batch) == 0:
+            break
+        results = analyze_degree_sequences(deg_dir, analysis.loc[batch].copy(),
+                                           pvalue='sequential', **kwargs)
+        for col in RESULTCOLUMNS:
+            analysis.loc[batch, col] = results.loc[batch, col]
+        npvalues += len(batch)
+    print '%d p-values computed, %d skipped as the categories did not depend on them' \
+        %(npvalues, nunknown)
+    # the p-values left out do not change the tests
+    filled = analysis.copy()
+    for fn in filled.index:
+        if missingresult(filled.loc[fn, 'ppl']) and \
+           not missingresult(filled.loc[fn, 'alpha']):
+            filled.loc[fn, 'ppl'] = 0.
+    hyps = categorize_networks(filled, permissive)
+    return [analysis, hyps]
@@ -13,6 +13,54 @@ certain properties. All are meant to be called directly.
 
 # filepath to error file
 errorfp = 'gmlerror.txt'
+# lines held back by writeerror() as [errorfile, errormessage] pairs, or None
+# to write them straight away (see holderrors())
+held = None
+
+def writeerror(errormessage, errorfile=None):
+    """ Writes a line to the error file, unless it is already there. While
+    holderrors() runs, the line is kept for the caller to write instead.
+
+    Input:
+        errormessage    string, gets written as a single line in the error file
+        errorfile       string, filepath of the error file, errorfp if None
+    """
+    if errorfile is None:
+        errorfile = errorfp
+    if held is not None:
+        held.append([errorfile, errormessage])
+        return
+    known = False
+    f = open(errorfile, 'a+')
+    f.seek(0)
+    for line in f:
+        if line == errormessage:
+            known = True
+    if not known:
+        f.write(errormessage)
+    f.close()
+
+def holderrors(func, *args):
+    """ Calls func(*args), holding back the lines writeerror() would write, so
+    that e.g. workers of a process pool leave the error files to the parent,
+    which writes the lines with writeerror().
+
+    Input:
+        func            function
+        args            arguments of func
+
+    Output:
+        result          whatever func(*args) returns
+        notes           list, [errorfile, errormessage] for each line held
+    """
+    global held
+    held = []
+    try:
+        result = func(*args)
+    finally:
+        notes = held
+        held = None
+    return [result, notes]
 
 def weighted(g, fp=''):
     """ Check whether the graph g is weighted. The built-in igraph check only
@@ -36,15 +84,7 @@ def weighted(g, fp=''):
     elif 'value' in g.es.attributes():
         errormessage = "%s is weighted but has attribute 'value' instead of 'weight'\n" %fp
         # only add this line to error file if we  haven't already noted this
-        known = False
-        f = open(errorfp, 'a+')
-        f.seek(0)
-        for line in f:
-            if line == errormessage:
-                known = True
-        if not known:
-            f.write(errormessage)
-        f.close()
+        writeerror(errormessage)
         if len(np.unique(g.es['value'])) >1:
             df_entry = 1
     return df_entry
@@ -114,15 +154,7 @@ def bipartite(g, fp=None):
         else:
             if fp:
                 errormessage = "%s is bipartite and has no attribute 'type'\n" %fp
-                known = False
-                f = open(errorfp, 'a+')
-                f.seek(0)
-                for line in f:
-                    if line == errormessage:
-                        known = True
-                if not known:
-                    f.write(errormessage)
-                f.close()
+                writeerror(errormessage)
                 df_entry = 'error'
             else:
                 df_entry = 0